@@ -0,0 +1,241 @@
+import datetime
+import os
+import sys
+import types
+import typing
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import orjson
+import pathway as pw
+
+try:
+    import pyarrow as pa
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+
+FLUSH_EVERY = 100  # Pending alerts that force a flush before the time step ends
+
+
+def _iov_max() -> int:
+    try:
+        limit = os.sysconf("SC_IOV_MAX")
+    except (AttributeError, ValueError, OSError):
+        limit = -1
+    return limit if limit > 0 else 1024
+
+
+IOV_MAX = _iov_max()  # Most buffers a single writev accepts
+OUTPUT_DIR_ENV = "GREENLEDGER_OUTPUT_DIR"  # When set, tables are written there as Arrow streams
+
+
+class AlertWriter:
+    """
+    Formats alert rows and writes them to stdout in batches.
+
+    All subscribed tables share one dispatcher keyed by alert kind. Lines
+    are buffered and flushed with a single os.writev at the end of every
+    Pathway time step (or once FLUSH_EVERY are pending), so a burst of N
+    alerts costs one syscall instead of N prints.
+    """
+
+    def __init__(self, fd: Optional[int] = None, flush_every: int = FLUSH_EVERY):
+        self.fd = fd
+        self.flush_every = flush_every
+        self.templates: Dict[str, Tuple[str, Sequence[str]]] = {}
+        self._pending: List[bytes] = []
+
+    def subscribe(self, table: pw.Table, kind: str, template: str, fields: Sequence[str]):
+        """Print `template % row[fields]` for every row added to `table`"""
+        self.templates[kind] = (template, tuple(fields))
+
+        def on_change(key, row, time, is_addition):
+            if is_addition:
+                self.emit(kind, row)
+
+        pw.io.subscribe(table, on_change, on_end=self.flush, on_time_end=lambda time: self.flush())
+
+    def emit(self, kind: str, row: dict):
+        template, fields = self.templates[kind]
+        line = template % tuple(row[field] for field in fields)
+        self.write(line.encode("utf-8") + b"\n")
+
+    def write(self, line: bytes):
+        """Queue an already encoded, newline-terminated line"""
+        self._pending.append(line)
+        if len(self._pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        sys.stdout.flush()
+        fd = sys.stdout.fileno() if self.fd is None else self.fd
+        write_all(fd, pending)
+
+
+def write_all(fd: int, buffers: List[bytes]):
+    """
+    Write every buffer to `fd`, resuming after short writes (for example
+    a pipe write cut short by a signal) and at most IOV_MAX per writev.
+    """
+    if not hasattr(os, "writev"):
+        buffers = [b"".join(buffers)]
+    views = [memoryview(buffer) for buffer in buffers]
+    first = 0
+    while first < len(views):
+        if hasattr(os, "writev"):
+            written = os.writev(fd, views[first:first + IOV_MAX])
+        else:
+            written = os.write(fd, views[first])
+        # Skip the buffers written in full, then trim the partly written one
+        while first < len(views) and written >= len(views[first]):
+            written -= len(views[first])
+            first += 1
+        if written:
+            views[first] = views[first][written:]
+
+
+alert_writer = AlertWriter()
+
+
+def write_ndjson(table: pw.Table, writer: AlertWriter = alert_writer):
+    """Write rows added to `table` as orjson-encoded JSON lines through `writer`"""
+    columns = table.column_names()
+
+    def on_change(key, row, time, is_addition):
+        if is_addition:
+            writer.write(orjson.dumps(
+                {name: row[name] for name in columns},
+                option=orjson.OPT_APPEND_NEWLINE,
+            ))
+
+    pw.io.subscribe(table, on_change, on_end=writer.flush, on_time_end=lambda time: writer.flush())
+
+
+def multiplex(tables: Dict[str, pw.Table]) -> pw.Table:
+    """
+    Concatenate differently shaped tables into one, tagged by a `kind` column.
+
+    The result carries the union of all columns; a column a table does not
+    have is None in its rows, so consumers dispatch on `kind`.
+    """
+    columns: Dict[str, Any] = {}
+    for table in tables.values():
+        for name, dtype in table.schema.typehints().items():
+            columns.setdefault(name, dtype)
+
+    parts = []
+    for kind, table in tables.items():
+        present = table.column_names()
+        parts.append(table.select(
+            kind=pw.literal(kind),
+            **{
+                name: pw.declare_type(Optional[dtype], table[name] if name in present else None)
+                for name, dtype in columns.items()
+            },
+        ))
+    return pw.Table.concat_reindex(*parts)
+
+
+def write_multiplexed(tables: Dict[str, pw.Table], name: str):
+    """Write several tables through a single sink, see `write_table`"""
+    write_table(multiplex(tables), name)
+
+
+def arrow_type(hint: Any) -> "pa.DataType":
+    """
+    Arrow type for a Pathway column typehint; Optional[T] maps to T since
+    every Arrow field is nullable. Types without a native Arrow equivalent
+    are stored as strings.
+    """
+    args = [arg for arg in typing.get_args(hint) if arg is not type(None)]
+    if typing.get_origin(hint) in (typing.Union, types.UnionType) and len(args) == 1:
+        hint = args[0]
+    if hint is bool:
+        return pa.bool_()
+    if hint is int:
+        return pa.int64()
+    if hint is float:
+        return pa.float64()
+    if hint is str:
+        return pa.string()
+    if isinstance(hint, type) and issubclass(hint, datetime.datetime):
+        return pa.timestamp("ns", tz="UTC" if hint.__name__ == "DateTimeUtc" else None)
+    if isinstance(hint, type) and issubclass(hint, datetime.timedelta):
+        return pa.duration("ns")
+    return pa.string()
+
+
+class ArrowStreamWriter:
+    """
+    Appends a table's changes to an Arrow IPC stream file.
+
+    Rows are collected column-wise during a Pathway time step and written
+    as one record batch when it ends, with Pathway's `time` and `diff`
+    columns, so readers get columnar data without any JSON decoding:
+    `pyarrow.ipc.open_stream(path).read_pandas()`.
+
+    The stream schema comes from the table's typehints, not from the first
+    batch, so columns that are all None in one step keep their type.
+    """
+
+    def __init__(self, path: Path, typehints: Dict[str, Any]):
+        self.path = path
+        self.schema = pa.schema(
+            [pa.field(name, arrow_type(hint)) for name, hint in typehints.items()]
+            + [pa.field("time", pa.int64()), pa.field("diff", pa.int8())]
+        )
+        self.columns = self.schema.names
+        self._stringify = {name for name in typehints if self.schema.field(name).type == pa.string()}
+        self._pending: Dict[str, List[Any]] = {name: [] for name in self.columns}
+        self._sink = None
+        self._writer = None
+
+    def on_change(self, key, row, time, is_addition):
+        for name in self.columns[:-2]:
+            value = row[name]
+            if name in self._stringify and value is not None and not isinstance(value, str):
+                value = str(value)
+            self._pending[name].append(value)
+        self._pending["time"].append(time)
+        self._pending["diff"].append(1 if is_addition else -1)
+
+    def flush(self):
+        if not self._pending["diff"]:
+            return
+        batch = pa.RecordBatch.from_pydict(self._pending, schema=self.schema)
+        if self._writer is None:
+            self._sink = pa.OSFile(str(self.path), "wb")
+            self._writer = pa.ipc.new_stream(self._sink, self.schema)
+        self._writer.write_batch(batch)
+        self._pending = {name: [] for name in self.columns}
+
+    def close(self):
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._sink.close()
+
+
+def write_table(table: pw.Table, name: str):
+    """
+    Write a table as an Arrow stream `<OUTPUT_DIR>/<name>.arrows` when
+    GREENLEDGER_OUTPUT_DIR is set and pyarrow is installed, or as JSON
+    lines on stdout otherwise.
+    """
+    output_dir = os.environ.get(OUTPUT_DIR_ENV)
+    if not output_dir or not ARROW_AVAILABLE:
+        pw.io.stdout.write(table, format="json")
+        return
+
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    writer = ArrowStreamWriter(Path(output_dir) / f"{name}.arrows", table.schema.typehints())
+    pw.io.subscribe(
+        table,
+        writer.on_change,
+        on_end=writer.close,
+        on_time_end=lambda time: writer.flush(),
+    )
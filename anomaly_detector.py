@@ -1,90 +1,64 @@
-import datetime
 from datetime import timedelta
 from typing import Optional
 
 import pathway as pw
 
-InputSchema = pw.schema_builder(
-    columns={
-        "plant_id": pw.column_definition(dtype=str),
-        "timestamp": pw.column_definition(dtype=str),
-        "energy_kwh": pw.column_definition(dtype=float),
-        "fuel_liters": pw.column_definition(dtype=float),
-        "production_units": pw.column_definition(dtype=int),
-        "temperature": pw.column_definition(dtype=float),
-    }
-)
+import alert_output
+import carbon_kernels
+import factory_common
+import window_aggregator
 
+EMISSION_THRESHOLD_KG = 500.0  # Max kg CO2 per reading
+EFFICIENCY_THRESHOLD = 20.0  # Max kg CO2 per production unit
+STATS_WINDOW_DURATION = timedelta(minutes=10)
+Z_SCORE_THRESHOLD = 2.0  # Standard deviations above the rolling mean
 
-@pw.table(with_versions=True)
-class FactoryStream:
-    plant_id: str
-    timestamp: datetime.datetime
-    energy_kwh: float
-    fuel_liters: float
-    production_units: int
-    temperature: float
-
-factory_stream = FactoryStream(
-    pw.io.stdin.read(
-        schema=InputSchema,
-        format="json",
-        autocommit_duration_ms=1000,
-    )
-)
+factory_stream = factory_common.build_factory_stream()
 
+# Narrow each branch to the columns it uses before filtering
+emissions = factory_stream.select(
+    pw.this.plant_id,
+    pw.this.timestamp,
+    pw.this.carbon_kg,
+)
 
-factory_stream = factory_stream.select(
-    plant_id=pw.this.plant_id,
-    timestamp=pw.this.timestamp.dt.strptime("%Y-%m-%dT%H:%M:%S.%f"),
-    energy_kwh=pw.this.energy_kwh,
-    fuel_liters=pw.this.fuel_liters,
-    production_units=pw.this.production_units,
-    temperature=pw.this.temperature,
-    carbon_kg=(pw.this.energy_kwh * 0.82) + (pw.this.fuel_liters * 2.31),
+temperatures = factory_stream.select(
+    pw.this.plant_id,
+    pw.this.timestamp,
+    pw.this.temperature,
 )
 
-violations = factory_stream.filter(
-    factory_stream.carbon_kg > EMISSION_THRESHOLD_KG
+violations = emissions.filter(
+    emissions.carbon_kg > EMISSION_THRESHOLD_KG
 )
 
 violations = violations.select(
     pw.this.plant_id,
     pw.this.timestamp,
     pw.this.carbon_kg,
-    pw.this.energy_kwh,
-    pw.this.fuel_liters,
     violation_type=pw.literal("THRESHOLD_EXCEEDED"),
     severity=pw.literal("HIGH"),
-    message=f"Emission {pw.this.carbon_kg:.1f}kg exceeds threshold {EMISSION_THRESHOLD_KG}kg",
 )
 
-rolling_stats = factory_stream.windowby(
-    factory_stream.timestamp,
-    window=pw.temporal.sliding(
-        hop=STATS_WINDOW_HOP,
-        duration=STATS_WINDOW_DURATION,
-    ),
-    behavior=pw.temporal.common_behavior(
-        cutoff=timedelta(seconds=30),
-        keep_results=True,
-    ),
-).groupby(pw.this.plant_id).reduce(
-    window_start=pw.this._pw_window_start,
-    window_end=pw.this._pw_window_end,
-    plant_id=pw.this._pw_grouping_key,
-    
+rolling_stats = factory_common.build_plant_windows(STATS_WINDOW_DURATION)
+
+window_stats = window_aggregator.window_columns(pw.this.stats)
+rolling_stats = rolling_stats.select(
+    pw.this.plant_id,
+    window_start=window_stats["window_start"],
+    window_end=window_stats["window_end"],
+
     # Rolling statistics
-    mean_carbon=pw.reducers.mean(pw.this.carbon_kg),
-    std_carbon=pw.reducers.std(pw.this.carbon_kg),
-    max_carbon=pw.reducers.max(pw.this.carbon_kg),
-    min_carbon=pw.reducers.min(pw.this.carbon_kg),
-    reading_count=pw.reducers.count(),
-    
+    mean_carbon=window_stats["mean_carbon_kg"],
+    std_carbon=window_stats["std_carbon_kg"],
+    max_carbon=window_stats["max_carbon_kg"],
+    min_carbon=window_stats["min_carbon_kg"],
+    reading_count=window_stats["reading_count"],
+
     # Current values
-    current_carbon=pw.reducers.last(pw.this.carbon_kg),
-    current_energy=pw.reducers.last(pw.this.energy_kwh),
-    current_fuel=pw.reducers.last(pw.this.fuel_liters),
+    current_carbon=window_stats["current_carbon"],
+    current_energy=window_stats["current_energy"],
+    current_fuel=window_stats["current_fuel"],
 )
 
 rolling_stats = rolling_stats.select(
@@ -105,11 +79,12 @@ rolling_stats = rolling_stats.select(
         if pw.this.std_carbon > 0
         else 0
     ),
-    is_spike=(
-        (pw.this.current_carbon - pw.this.mean_carbon) / pw.this.std_carbon > 2.0
-        if pw.this.std_carbon > 0
-        else False
-    ),
+)
+
+# z_score is already 0 when std is 0, so no second guard or division needed
+rolling_stats = rolling_stats.select(
+    *pw.this,
+    is_spike=pw.this.z_score > Z_SCORE_THRESHOLD,
 )
 
 spikes = rolling_stats.filter(pw.this.is_spike)
@@ -123,11 +98,10 @@ spikes = spikes.select(
     z_score=pw.this.z_score,
     violation_type=pw.literal("SPIKE_DETECTED"),
     severity=pw.literal("MEDIUM"),
-    message=f"Spike detected: {pw.this.z_score:.1f}σ above mean",
 )
 
-temp_alerts = factory_stream.filter(
-    factory_stream.temperature > 35  # Celsius
+temp_alerts = temperatures.filter(
+    temperatures.temperature > 35  # Celsius
 )
 
 temp_alerts = temp_alerts.select(
@@ -136,7 +110,6 @@ temp_alerts = temp_alerts.select(
     pw.this.temperature,
     violation_type=pw.literal("HIGH_TEMPERATURE"),
     severity=pw.literal("LOW"),
-    message=f"Temperature {pw.this.temperature:.1f}°C exceeds normal range",
 )
 
 factory_with_efficiency = factory_stream.select(
@@ -144,15 +117,11 @@ factory_with_efficiency = factory_stream.select(
     pw.this.timestamp,
     pw.this.carbon_kg,
     pw.this.production_units,
-    efficiency=(
-        pw.this.carbon_kg / pw.this.production_units
-        if pw.this.production_units > 0
-        else 0
-    ),
+    efficiency=carbon_kernels.efficiency(pw.this.carbon_kg, pw.this.production_units),
 )
 
 low_efficiency = factory_with_efficiency.filter(
-    pw.this.efficiency > efficiency_threshold
+    pw.this.efficiency > EFFICIENCY_THRESHOLD
 )
 
 low_efficiency = low_efficiency.select(
@@ -163,43 +132,26 @@ low_efficiency = low_efficiency.select(
     efficiency=pw.this.efficiency,
     violation_type=pw.literal("LOW_EFFICIENCY"),
     severity=pw.literal("MEDIUM"),
-    message=f"Low efficiency: {pw.this.efficiency:.1f}kg CO2/unit (threshold: {efficiency_threshold})",
 )
 
-pw.io.stdout.write(
-    violations,
-    format="json",
-)
-
-pw.io.stdout.write(
-    spikes,
-    format="json",
-)
+alert_output.write_multiplexed({
+    "violation": violations,
+    "spike": spikes,
+    "temp": temp_alerts,
+    "efficiency": low_efficiency,
+}, "anomalies")
 
-pw.io.stdout.write(
-    temp_alerts,
-    format="json",
+alert_writer = alert_output.alert_writer
+alert_writer.subscribe(
+    violations, "THRESHOLD_EXCEEDED",
+    f"🚨 ALERT: %s at %s: Emission %.1fkg exceeds threshold {EMISSION_THRESHOLD_KG}kg",
+    ("plant_id", "timestamp", "carbon_kg"),
 )
-
-pw.io.stdout.write(
-    low_efficiency,
-    format="json",
+alert_writer.subscribe(
+    spikes, "SPIKE_DETECTED",
+    "⚠️  SPIKE: %s - z-score: %.2f", ("plant_id", "z_score"),
 )
 
-def on_violation(key, row, time, is_addition):
-    """Handle violation events"""
-    if is_addition:
-        print(f"🚨 ALERT: {row['plant_id']} at {row['timestamp']}: {row['message']}")
-
-
-def on_spike(key, row, time, is_addition):
-    """Handle spike events"""
-    if is_addition:
-        print(f"⚠️  SPIKE: {row['plant_id']} - z-score: {row['z_score']:.2f}")
-
-pw.io.subscribe(violations, on_violation)
-pw.io.subscribe(spikes, on_spike)
-
 if __name__ == "__main__":
     import argparse
     import sys
@@ -218,6 +170,6 @@ if __name__ == "__main__":
     
     print("Starting GreenLedger Anomaly Detector...", file=sys.stderr)
     print(f"Threshold: {args.threshold}kg CO2", file=sys.stderr)
-    print(f"Z-score threshold: 2.0 standard deviations", file=sys.stderr)
+    print(f"Z-score threshold: {Z_SCORE_THRESHOLD} standard deviations", file=sys.stderr)
     
     pw.run()
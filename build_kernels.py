@@ -0,0 +1,19 @@
+import sys
+import time
+
+import carbon_kernels
+
+
+def build_kernels():
+    """Compile the Numba kernels into NUMBA_CACHE_DIR ahead of the first pw.run()"""
+    if not carbon_kernels.NUMBA_AVAILABLE:
+        print("Warning: Numba not available. Kernels will run as plain NumPy.", file=sys.stderr)
+        return
+
+    start = time.perf_counter()
+    carbon_kernels.warm_up()
+    print(f"Compiled kernels in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    build_kernels()
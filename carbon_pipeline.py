@@ -1,88 +1,41 @@
-import datetime
 from datetime import timedelta
 
 import pathway as pw
 
-def calculate_carbon(energy_kwh: float, fuel_liters: float) -> float:
-    """Calculate carbon emissions in kg"""
-    return (energy_kwh * 0.82) + (fuel_liters * 2.31)
-InputSchema = pw.schema_builder(
-    columns={
-        "plant_id": pw.column_definition(dtype=str),
-        "timestamp": pw.column_definition(dtype=str),
-        "energy_kwh": pw.column_definition(dtype=float),
-        "fuel_liters": pw.column_definition(dtype=float),
-        "production_units": pw.column_definition(dtype=int),
-        "temperature": pw.column_definition(dtype=float),
-    }
-)
+import alert_output
+import factory_common
+import window_aggregator
 
-@pw.table(with_versions=True)
-class FactoryStream:
-    plant_id: str
-    timestamp: datetime.datetime
-    energy_kwh: float
-    fuel_liters: float
-    production_units: int
-    temperature: float
-
-factory_stream = FactoryStream(
-    pw.io.stdin.read(
-        schema=InputSchema,
-        format="json",
-        autocommit_duration_ms=1000,
-    )
-)
+factory_stream = factory_common.build_factory_stream()
 
+WINDOW_DURATION = timedelta(minutes=10)
 
-factory_stream = factory_stream.select(
-    plant_id=pw.this.plant_id,
-    timestamp=pw.this.timestamp.dt.strptime("%Y-%m-%dT%H:%M:%S.%f"),
-    energy_kwh=pw.this.energy_kwh,
-    fuel_liters=pw.this.fuel_liters,
-    production_units=pw.this.production_units,
-    temperature=pw.this.temperature,
-)
-factory_stream = factory_stream.select(
-    pw.this.plant_id,
+rolling_window = window_aggregator.sliding_window_reducer(WINDOW_DURATION)
+window_args = (
     pw.this.timestamp,
+    pw.this.plant_id,
+    pw.this.carbon_kg,
     pw.this.energy_kwh,
     pw.this.fuel_liters,
     pw.this.production_units,
-    pw.this.temperature,
-    carbon_kg=calculate_carbon(pw.this.energy_kwh, pw.this.fuel_liters),
 )
+window_stats = window_aggregator.window_columns(pw.this.stats)
 
-WINDOW_DURATION = timedelta(minutes=10)
-WINDOW_HOP = timedelta(minutes=1)
-
-windowed_by_plant = factory_stream.windowby(
-    factory_stream.timestamp,
-    window=pw.temporal.sliding(
-        hop=WINDOW_HOP,
-        duration=WINDOW_DURATION,
-    ),
-    behavior=pw.temporal.common_behavior(
-        cutoff=timedelta(seconds=30),
-        keep_results=True,  # Keep for comparison
-    ),
-).groupby(
-    pw.this.plant_id
-).reduce(
-  
-    window_start=pw.this._pw_window_start,
-    window_end=pw.this._pw_window_end,
-    plant_id=pw.this._pw_grouping_key,
-    
-    total_energy_kwh=pw.reducers.sum(pw.this.energy_kwh),
-    total_fuel_liters=pw.reducers.sum(pw.this.fuel_liters),
-    total_production=pw.reducers.sum(pw.this.production_units),
-    reading_count=pw.reducers.count(),
-    
-    total_carbon_kg=pw.reducers.sum(pw.this.carbon_kg),
-    avg_carbon_per_reading=pw.reducers.mean(pw.this.carbon_kg),
-    max_carbon_kg=pw.reducers.max(pw.this.carbon_kg),
-    min_carbon_kg=pw.reducers.min(pw.this.carbon_kg),
+# Same per-plant window as the anomaly detector, computed once when both run
+windowed_by_plant = factory_common.build_plant_windows(WINDOW_DURATION).select(
+    pw.this.plant_id,
+    window_start=window_stats["window_start"],
+    window_end=window_stats["window_end"],
+
+    total_energy_kwh=window_stats["total_energy_kwh"],
+    total_fuel_liters=window_stats["total_fuel_liters"],
+    total_production=window_stats["total_production"],
+    reading_count=window_stats["reading_count"],
+
+    total_carbon_kg=window_stats["total_carbon_kg"],
+    avg_carbon_per_reading=window_stats["mean_carbon_kg"],
+    max_carbon_kg=window_stats["max_carbon_kg"],
+    min_carbon_kg=window_stats["min_carbon_kg"],
 )
 
 windowed_by_plant = windowed_by_plant.select(
@@ -105,22 +58,18 @@ windowed_by_plant = windowed_by_plant.select(
     ),
 )
 
-windowed_global = factory_stream.windowby(
-    factory_stream.timestamp,
-    window=pw.temporal.sliding(
-        hop=WINDOW_HOP,
-        duration=WINDOW_DURATION,
-    ),
-).reduce(
-    window_start=pw.this._pw_window_start,
-    window_end=pw.this._pw_window_end,
-    
-    total_energy_kwh=pw.reducers.sum(pw.this.energy_kwh),
-    total_fuel_liters=pw.reducers.sum(pw.this.fuel_liters),
-    total_production=pw.reducers.sum(pw.this.production_units),
-    reading_count=pw.reducers.count(),
-    total_carbon_kg=pw.reducers.sum(pw.this.carbon_kg),
-    unique_plants=pw.reducers.count_unique(pw.this.plant_id),
+windowed_global = factory_stream.reduce(
+    stats=rolling_window(*window_args),
+).select(
+    window_start=window_stats["window_start"],
+    window_end=window_stats["window_end"],
+
+    total_energy_kwh=window_stats["total_energy_kwh"],
+    total_fuel_liters=window_stats["total_fuel_liters"],
+    total_production=window_stats["total_production"],
+    reading_count=window_stats["reading_count"],
+    total_carbon_kg=window_stats["total_carbon_kg"],
+    unique_plants=window_stats["unique_plants"],
 )
 
 windowed_global = windowed_global.select(
@@ -140,35 +89,27 @@ windowed_global = windowed_global.select(
 )
 
 
-daily_by_plant = factory_stream.windowby(
-    factory_stream.timestamp,
-    window=pw.temporal.tumbling(datetime.timedelta(days=1)),
-    behavior=pw.temporal.exactly_once_behavior(),
-).groupby(pw.this.plant_id).reduce(
-    date=pw.this._pw_window_start.date(),
-    plant_id=pw.this._pw_grouping_key,
+# Daily totals are plain sums, so group by calendar day and let Pathway keep
+# one running counter per (plant, day) instead of buffering the day's readings
+daily_by_plant = factory_stream.select(
+    pw.this.plant_id,
+    pw.this.energy_kwh,
+    pw.this.fuel_liters,
+    pw.this.production_units,
+    pw.this.carbon_kg,
+    day=pw.this.timestamp.dt.floor(timedelta(days=1)),
+).groupby(pw.this.plant_id, pw.this.day).reduce(
+    date=pw.this.day.date(),
+    plant_id=pw.this.plant_id,
     daily_energy_kwh=pw.reducers.sum(pw.this.energy_kwh),
     daily_fuel_liters=pw.reducers.sum(pw.this.fuel_liters),
     daily_production=pw.reducers.sum(pw.this.production_units),
     daily_carbon_kg=pw.reducers.sum(pw.this.carbon_kg),
 )
 
-pw.io.stdout.write(
-    windowed_by_plant,
-    format="json",
-)
-
-pw.io.stdout.write(
-    windowed_global,
-    format="json",
-    output_path="global_window",
-)
-
-pw.io.stdout.write(
-    daily_by_plant,
-    format="json",
-    output_path="daily_summary",
-)
+alert_output.write_table(windowed_by_plant, "plant_window")
+alert_output.write_table(windowed_global, "global_window")
+alert_output.write_table(daily_by_plant, "daily_summary")
 
 if __name__ == "__main__":
     import argparse
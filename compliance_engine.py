@@ -1,51 +1,42 @@
-import datetime
 from datetime import timedelta
+from typing import List, Optional, Tuple
 
+import numpy as np
 import pathway as pw
 
+import alert_output
+import carbon_kernels
+import factory_common
+import window_aggregator
+
 HOURLY_EMISSION_LIMIT_KG = 500.0  # Max kg CO2 per hour
 DAILY_EMISSION_LIMIT_KG = 10000.0  # Max kg CO2 per day
 EFFICIENCY_MIN = 10.0  # Min kg CO2 per production unit
 EFFICIENCY_MAX = 20.0  # Max kg CO2 per production unit (warning level)
+PANE_DURATION = timedelta(minutes=5)  # gcd of the hourly, daily and sliding windows
+LATE_READING_CUTOFF = timedelta(hours=2)  # Readings later than this are dropped from their pane
+
+factory_stream = factory_common.build_factory_stream()
 
-InputSchema = pw.schema_builder(
-    columns={
-        "plant_id": pw.column_definition(dtype=str),
-        "timestamp": pw.column_definition(dtype=str),
-        "energy_kwh": pw.column_definition(dtype=float),
-        "fuel_liters": pw.column_definition(dtype=float),
-        "production_units": pw.column_definition(dtype=int),
-        "temperature": pw.column_definition(dtype=float),
-    }
+# Compliance rules only look at emissions and output, not energy/fuel/temperature
+emissions = factory_stream.select(
+    pw.this.plant_id,
+    pw.this.timestamp,
+    pw.this.carbon_kg,
+    pw.this.production_units,
 )
 
 
-@pw.table(with_versions=True)
-class FactoryStream:
-    plant_id: str
-    timestamp: datetime.datetime
-    energy_kwh: float
-    fuel_liters: float
-    production_units: int
-    temperature: float
-
-factory_stream = FactoryStream(
-    pw.io.stdin.read(
-        schema=InputSchema,
-        format="json",
-        autocommit_duration_ms=1000,
+@pw.udf(return_type=Tuple[float, float], deterministic=True, max_batch_size=carbon_kernels.UDF_BATCH_SIZE)
+def efficiency_and_score(total_carbon: List[float], total_production: List[float]) -> List[Tuple[float, float]]:
+    """(efficiency, compliance score) for a batch of windows"""
+    efficiency, scores = carbon_kernels.efficiency_scores(
+        np.asarray(total_carbon, dtype=np.float64),
+        np.asarray(total_production, dtype=np.float64),
+        EFFICIENCY_MIN,
     )
-)
+    return list(zip(efficiency.tolist(), scores.tolist()))
 
-factory_stream = factory_stream.select(
-    plant_id=pw.this.plant_id,
-    timestamp=pw.this.timestamp.dt.strptime("%Y-%m-%dT%H:%M:%S.%f"),
-    energy_kwh=pw.this.energy_kwh,
-    fuel_liters=pw.this.fuel_liters,
-    production_units=pw.this.production_units,
-    temperature=pw.this.temperature,
-    carbon_kg=(pw.this.energy_kwh * 0.82) + (pw.this.fuel_liters * 2.31),
-)
 
 class ComplianceRule:
     """Base class for compliance rules"""
@@ -55,15 +46,42 @@ class ComplianceRule:
         self.description = description
         self.severity = severity
 
-hourly_window = factory_stream.windowby(
-    factory_stream.timestamp,
-    window=pw.temporal.tumbling(timedelta(hours=1)),
+# Every compliance window is a whole number of 5-minute panes, so readings
+# are summed once per pane and the windows below only combine pane partials
+# Once a pane is past the cutoff its per-reading state is freed and only the
+# pane totals are kept, so memory grows with panes rather than readings
+panes = emissions.windowby(
+    emissions.timestamp,
+    window=pw.temporal.tumbling(PANE_DURATION),
+    behavior=pw.temporal.common_behavior(
+        cutoff=LATE_READING_CUTOFF,
+        keep_results=True,
+    ),
 ).groupby(pw.this.plant_id).reduce(
-    window_start=pw.this._pw_window_start,
-    window_end=pw.this._pw_window_end,
+    pane_start=pw.this._pw_window_start,
     plant_id=pw.this._pw_grouping_key,
-    hourly_carbon=pw.reducers.sum(pw.this.carbon_kg),
-    reading_count=pw.reducers.count(),
+    pane_carbon=pw.reducers.sum(pw.this.carbon_kg),
+    pane_production=pw.reducers.sum(pw.this.production_units),
+    pane_latest=pw.reducers.max(pw.this.timestamp),
+)
+
+panes = panes.select(
+    *pw.this,
+    hour_start=pw.this.pane_start.dt.floor(timedelta(hours=1)),
+    day_start=pw.this.pane_start.dt.floor(timedelta(days=1)),
+)
+
+hourly_window = panes.groupby(pw.this.plant_id, pw.this.hour_start).reduce(
+    pw.this.plant_id,
+    window_start=pw.this.hour_start,
+    hourly_carbon=pw.reducers.sum(pw.this.pane_carbon),
+    hourly_production=pw.reducers.sum(pw.this.pane_production),
+    latest_timestamp=pw.reducers.max(pw.this.pane_latest),
+)
+
+hourly_window = hourly_window.select(
+    *pw.this,
+    window_end=pw.this.window_start + timedelta(hours=1),
 )
 
 hourly_violations = hourly_window.filter(
@@ -82,16 +100,16 @@ hourly_violations = hourly_violations.select(
     compliance_status=pw.literal("NON_COMPLIANT"),
 )
 
-daily_window = factory_stream.windowby(
-    factory_stream.timestamp,
-    window=pw.temporal.tumbling(timedelta(days=1)),
-).groupby(pw.this.plant_id).reduce(
-    window_start=pw.this._pw_window_start,
-    window_end=pw.this._pw_window_end,
-    plant_id=pw.this._pw_grouping_key,
-    daily_carbon=pw.reducers.sum(pw.this.carbon_kg),
-    total_production=pw.reducers.sum(pw.this.production_units),
-    reading_count=pw.reducers.count(),
+daily_window = panes.groupby(pw.this.plant_id, pw.this.day_start).reduce(
+    pw.this.plant_id,
+    window_start=pw.this.day_start,
+    daily_carbon=pw.reducers.sum(pw.this.pane_carbon),
+    total_production=pw.reducers.sum(pw.this.pane_production),
+)
+
+daily_window = daily_window.select(
+    *pw.this,
+    window_end=pw.this.window_start + timedelta(days=1),
 )
 
 daily_violations = daily_window.filter(
@@ -109,16 +127,12 @@ daily_violations = daily_violations.select(
     compliance_status=pw.literal("NON_COMPLIANT"),
 )
 
-factory_efficiency = factory_stream.select(
+factory_efficiency = emissions.select(
     plant_id=pw.this.plant_id,
     timestamp=pw.this.timestamp,
     carbon_kg=pw.this.carbon_kg,
     production_units=pw.this.production_units,
-    efficiency=(
-        pw.this.carbon_kg / pw.this.production_units
-        if pw.this.production_units > 0
-        else 0
-    ),
+    efficiency=carbon_kernels.efficiency(pw.this.carbon_kg, pw.this.production_units),
 )
 
 inefficiency_violations = factory_efficiency.filter(
@@ -139,130 +153,94 @@ inefficiency_violations = inefficiency_violations.select(
     compliance_status=pw.literal("NEEDS_IMPROVEMENT"),
 )
 
-compliance_window = factory_stream.windowby(
-    factory_stream.timestamp,
-    window=pw.temporal.sliding(
-        hop=timedelta(minutes=5),
-        duration=timedelta(hours=1),
-    ),
-    behavior=pw.temporal.common_behavior(
-        cutoff=timedelta(seconds=30),
-        keep_results=True,
-    ),
-).groupby(pw.this.plant_id).reduce(
-    window_start=pw.this._pw_window_start,
-    window_end=pw.this._pw_window_end,
-    plant_id=pw.this._pw_grouping_key,
-    
-    total_carbon=pw.reducers.sum(pw.this.carbon_kg),
-    total_production=pw.reducers.sum(pw.this.production_units),
-    reading_count=pw.reducers.count(),
+# Trailing hour per plant, advanced pane by pane: each 5-minute pane is added
+# once and subtracted once when it expires, rather than summed into 12 windows
+trailing_hour = window_aggregator.trailing_sum_reducer(timedelta(hours=1), PANE_DURATION)
 
-compliance_window = compliance_window.select(
-    pw.this.window_start,
-    pw.this.window_end,
+compliance_window = panes.groupby(pw.this.plant_id).reduce(
     pw.this.plant_id,
-    pw.this.total_carbon,
-    pw.this.total_production,
-    pw.this.reading_count,
-    efficiency=(
-        pw.this.total_carbon / pw.this.total_production
-        if pw.this.total_production > 0
-        else 0
+    totals=trailing_hour(
+        pw.this.pane_start,
+        pw.this.pane_carbon,
+        pw.this.pane_production,
     ),
 )
 
+# The window totals and the scoring UDF share one projection; the second
+# only unpacks the (efficiency, score) pair. The reducer takes any number
+# of values, so its result is untyped and each entry is declared here
+total_carbon = pw.declare_type(float, pw.this.totals[2])
+total_production = pw.declare_type(int, pw.this.totals[3])
+compliance_window = compliance_window.select(
+    window_start=pw.declare_type(Optional[pw.DateTimeNaive], pw.this.totals[0]),
+    window_end=pw.declare_type(Optional[pw.DateTimeNaive], pw.this.totals[1]),
+    plant_id=pw.this.plant_id,
+    total_carbon=total_carbon,
+    total_production=total_production,
+    scored=efficiency_and_score(total_carbon, total_production),
+)
+
 compliance_window = compliance_window.select(
     pw.this.window_start,
     pw.this.window_end,
     pw.this.plant_id,
     pw.this.total_carbon,
     pw.this.total_production,
-    pw.this.efficiency,
- 
-    compliance_score=(
-        100 - (pw.this.efficiency - EFFICIENCY_MIN) * 10
-        if pw.this.efficiency > EFFICIENCY_MIN
-        else 50
-    ),
+    efficiency=pw.this.scored[0],
+    compliance_score=pw.this.scored[1],
 )
 
 
-latest_reading = factory_stream.groupby(pw.this.plant_id).reduce(
-    plant_id=pw.this._pw_grouping_key,
-    latest_timestamp=pw.this.timestamp.dt.max,
-    latest_carbon=pw.reducers.sum(pw.this.carbon_kg),
-    total_production=pw.reducers.sum(pw.this.production_units),
+# Latest status per plant, read off the current hourly window
+latest_window = hourly_window.groupby(pw.this.plant_id).reduce(
+    pw.this.plant_id,
+    window_id=pw.reducers.argmax(pw.this.window_end),
 )
+latest_hour = hourly_window.ix(latest_window.window_id)
 
-latest_reading = latest_reading.select(
+latest_reading = latest_window.select(
     pw.this.plant_id,
-    pw.this.latest_timestamp,
-    pw.this.latest_carbon,
-    pw.this.total_production,
+    latest_timestamp=latest_hour.latest_timestamp,
+    latest_carbon=latest_hour.hourly_carbon,
+    total_production=latest_hour.hourly_production,
    
     is_compliant=(
-        pw.this.latest_carbon <= HOURLY_EMISSION_LIMIT_KG
+        latest_hour.hourly_carbon <= HOURLY_EMISSION_LIMIT_KG
     ),
     efficiency=(
-        pw.this.latest_carbon / pw.this.total_production
-        if pw.this.total_production > 0
+        latest_hour.hourly_carbon / latest_hour.hourly_production
+        if latest_hour.hourly_production > 0
         else 0
     ),
 )
 
-pw.io.stdout.write(
-    hourly_violations,
-    format="json",
-)
+alert_output.write_multiplexed({
+    "hourly": hourly_violations,
+    "daily": daily_violations,
+    "efficiency": inefficiency_violations,
+    "score": compliance_window,
+    "status": latest_reading,
+}, "compliance")
 
-pw.io.stdout.write(
-    daily_violations,
-    format="json",
-)
 
-pw.io.stdout.write(
-    inefficiency_violations,
-    format="json",
+alert_writer = alert_output.alert_writer
+alert_writer.subscribe(
+    hourly_violations, "HOURLY_EMISSION_LIMIT",
+    "🔴 CRITICAL: %s - Hourly limit exceeded! %.1fkg / %skg limit",
+    ("plant_id", "hourly_carbon", "limit"),
 )
-
-pw.io.stdout.write(
-    compliance_window,
-    format="json",
+alert_writer.subscribe(
+    daily_violations, "DAILY_EMISSION_LIMIT",
+    "🔴 CRITICAL: %s - Daily limit exceeded! %.1fkg / %skg limit",
+    ("plant_id", "daily_carbon", "limit"),
 )
-
-pw.io.stdout.write(
-    latest_reading,
-    format="json",
+alert_writer.subscribe(
+    inefficiency_violations, "EFFICIENCY_MINIMUM",
+    "⚠️  WARNING: %s - Low efficiency! %.1fkg CO2/unit",
+    ("plant_id", "efficiency"),
 )
 
 
-def on_hourly_violation(key, row, time, is_addition):
-    """Handle hourly violation events"""
-    if is_addition:
-        print(f"🔴 CRITICAL: {row['plant_id']} - Hourly limit exceeded! "
-              f"{row['hourly_carbon']:.1f}kg / {row['limit']}kg limit")
-
-
-def on_daily_violation(key, row, time, is_addition):
-    """Handle daily violation events"""
-    if is_addition:
-        print(f"🔴 CRITICAL: {row['plant_id']} - Daily limit exceeded! "
-              f"{row['daily_carbon']:.1f}kg / {row['limit']}kg limit")
-
-
-def on_inefficiency(key, row, time, is_addition):
-    """Handle inefficiency events"""
-    if is_addition:
-        print(f"⚠️  WARNING: {row['plant_id']} - Low efficiency! "
-              f"{row['efficiency']:.1f}kg CO2/unit")
-
-
-pw.io.subscribe(hourly_violations, on_hourly_violation)
-pw.io.subscribe(daily_violations, on_daily_violation)
-pw.io.subscribe(inefficiency_violations, on_inefficiency)
-
-
 if __name__ == "__main__":
     import argparse
     import sys
@@ -3,16 +3,47 @@ import pandas as pd
 import numpy as np
 import json
 import time
+from collections import deque
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
-import plotly.express as px
+from typing import Deque, List, Dict, Any, Optional, Sequence
 import plotly.graph_objects as go
+from matplotlib import colormaps
+from matplotlib.colors import Normalize
+
+try:
+    from streamlit_autorefresh import st_autorefresh
+    AUTOREFRESH_AVAILABLE = True
+except ImportError:
+    AUTOREFRESH_AVAILABLE = False
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
 
 PAGE_TITLE = "GreenLedger - Carbon Accountability"
 PAGE_ICON = "🌱"
 LAYOUT = "wide"
 
 REFRESH_INTERVAL = 5
+MAX_VIOLATIONS = 50
+MAX_CHART_POINTS = 500  # Per plant; longer series are LTTB-downsampled before plotting
+EFFICIENCY_COLOR_RANGE = (0.0, 25.0)  # kg CO2/unit mapped onto the comparison colormap
+
+RATING_THRESHOLDS = np.array([10.0, 15.0, 20.0])  # kg CO2/unit upper bounds of each rating
+RATING_LABELS = np.array(["🟢 Excellent", "🟡 Good", "🟠 Warning", "🔴 Critical"], dtype=object)
+MEDALS = ["🥇", "🥈", "🥉"]
+
+# Reading fields kept by the dashboard and the dtype of their column buffer
+READING_COLUMNS = {
+    "plant_id": object,
+    "timestamp": object,
+    "energy_kwh": np.float64,
+    "fuel_liters": np.float64,
+    "production_units": np.int64,
+    "carbon_kg": np.float64,
+}
 
 PLANT_COLORS = {
     "Plant_A": "#2E86AB",
@@ -26,31 +57,45 @@ class DashboardData:
     
     def __init__(self, max_points: int = 100):
         self.max_points = max_points
-        self.data: List[Dict] = []
-        self.violations: List[Dict] = []
-        self.alerts: List[Dict] = []
+        # Readings live in one ring buffer per column (SoA); `written` counts
+        # every reading ever added, so `written % max_points` is the next slot
+        self.columns: Dict[str, np.ndarray] = {
+            name: np.empty(max_points, dtype=dtype) for name, dtype in READING_COLUMNS.items()
+        }
+        self.written = 0
+        self.version = 0  # Bumped on every change, keys the cached views below
+        # Bounded deques drop the oldest entry on append, no re-slicing
+        self.violations: Deque[Dict] = deque(maxlen=MAX_VIOLATIONS)
+        self.alerts: Deque[Dict] = deque(maxlen=MAX_VIOLATIONS)
+    
+    def __len__(self) -> int:
+        return min(self.written, self.max_points)
     
     def add_reading(self, reading: Dict):
         """Add a new reading"""
-        self.data.append(reading)
-        
-        # Keep only recent data
-        if len(self.data) > self.max_points:
-            self.data = self.data[-self.max_points:]
+        slot = self.written % self.max_points
+        for name, column in self.columns.items():
+            column[slot] = reading[name]
+        self.written += 1
+        self.version += 1
     
     def add_violation(self, violation: Dict):
         """Add a violation"""
         self.violations.append(violation)
-        
-        # Keep only recent violations
-        if len(self.violations) > 50:
-            self.violations = self.violations[-50:]
+        self.version += 1
     
     def get_dataframe(self) -> pd.DataFrame:
         """Get data as DataFrame"""
-        if not self.data:
+        if not len(self):
             return pd.DataFrame()
-        return pd.DataFrame(self.data)
+        if self.written <= self.max_points:
+            return pd.DataFrame({name: column[:self.written] for name, column in self.columns.items()})
+        # Buffer has wrapped: the oldest reading sits at the next write slot
+        oldest = self.written % self.max_points
+        return pd.DataFrame({
+            name: np.concatenate((column[oldest:], column[:oldest]))
+            for name, column in self.columns.items()
+        })
     
     def get_current_values(self) -> Dict[str, Any]:
         """Get current values for each plant"""
@@ -58,24 +103,20 @@ class DashboardData:
         if df.empty:
             return {}
         
-        current = {}
-        for plant in df["plant_id"].unique():
-            plant_data = df[df["plant_id"] == plant].tail(10)
-            if not plant_data.empty:
-                current[plant] = {
-                    "carbon_kg": plant_data["carbon_kg"].sum(),
-                    "energy_kwh": plant_data["energy_kwh"].sum(),
-                    "fuel_liters": plant_data["fuel_liters"].sum(),
-                    "production_units": plant_data["production_units"].sum(),
-                    "efficiency": (
-                        plant_data["carbon_kg"].sum() / plant_data["production_units"].sum()
-                        if plant_data["production_units"].sum() > 0
-                        else 0
-                    ),
-                    "timestamp": plant_data["timestamp"].max()
-                }
-        
-        return current
+        # One hash partition by plant instead of a boolean mask per plant
+        recent = df.groupby("plant_id", sort=False).tail(10)
+        totals = recent.groupby("plant_id", sort=False).agg(
+            carbon_kg=("carbon_kg", "sum"),
+            energy_kwh=("energy_kwh", "sum"),
+            fuel_liters=("fuel_liters", "sum"),
+            production_units=("production_units", "sum"),
+            timestamp=("timestamp", "max"),
+        )
+        production = totals["production_units"]
+        totals["efficiency"] = np.where(
+            production > 0, totals["carbon_kg"] / production.where(production > 0, 1), 0
+        )
+        return totals.to_dict("index")
     
     def get_summary(self) -> Dict[str, Any]:
         """Get overall summary"""
@@ -106,6 +147,13 @@ class DashboardData:
 # Initialize data store
 data_store = DashboardData()
 
+
+@st.cache_data(max_entries=1)
+def store_views(version: int, _store: DashboardData):
+    """DataFrame, current values and summary of the store, rebuilt only when `version` changes"""
+    return _store.get_dataframe(), _store.get_current_values(), _store.get_summary()
+
+
 def init_page():
     """Initialize the Streamlit page"""
     st.set_page_config(
@@ -223,6 +271,88 @@ def metrics_row(summary: Dict[str, Any]):
         )
 
 
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Indices of the points kept by Largest-Triangle-Three-Buckets downsampling.
+
+    The first and last points are always kept; in between, each bucket
+    keeps the point forming the largest triangle with the previously kept
+    point and the mean of the next bucket, which preserves peaks.
+    """
+    n = x.shape[0]
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0] = 0
+    kept[n_out - 1] = n - 1
+    every = (n - 2) / (n_out - 2)
+    a = 0
+    for i in range(n_out - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        best = start
+        best_area = -1.0
+        for j in range(start, end):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best_area:
+                best_area = area
+                best = j
+        kept[i + 1] = best
+        a = best
+    return kept
+
+
+if NUMBA_AVAILABLE:
+    lttb_indices = njit(cache=True)(lttb_indices)
+
+
+@st.cache_resource
+def make_carbon_fig() -> go.Figure:
+    """
+    Emissions figure template with one empty WebGL trace per known plant.
+
+    Cached across sessions, so callers must copy it with go.Figure()
+    before filling in data.
+    """
+    fig = go.Figure()
+    for plant, color in PLANT_COLORS.items():
+        fig.add_trace(go.Scattergl(x=[], y=[], mode="lines", name=plant, line=dict(color=color)))
+    
+    fig.update_layout(
+        title="Carbon Emissions (kg CO2)",
+        xaxis_title="Time",
+        yaxis_title="Carbon Emissions (kg CO2)",
+        legend_title="Plant",
+        template="plotly_dark"
+    )
+    return fig
+
+
+@st.cache_resource
+def make_efficiency_fig() -> go.Figure:
+    """Efficiency bar figure template with its threshold lines; copy before use"""
+    fig = go.Figure(go.Bar(x=[], y=[], name="Efficiency"))
+    
+    # Add threshold line
+    fig.add_hline(y=15, line_dash="dash", line_color="orange", 
+                  annotation_text="Warning Threshold")
+    fig.add_hline(y=20, line_dash="dash", line_color="red",
+                  annotation_text="Critical Threshold")
+    
+    fig.update_layout(
+        title="Average Efficiency (kg CO2 per production unit)",
+        xaxis_title="Plant",
+        yaxis_title="Efficiency (kg CO2/unit)",
+        template="plotly_dark"
+    )
+    return fig
+
+
 def carbon_chart(df: pd.DataFrame, plants: List[str]):
     """Display carbon emissions chart"""
     st.subheader("📊 Carbon Emissions Over Time")
@@ -238,23 +368,24 @@ def carbon_chart(df: pd.DataFrame, plants: List[str]):
         st.info("No data for selected plants")
         return
     
-    # Create line chart
-    fig = px.line(
-        df,
-        x="timestamp",
-        y="carbon_kg",
-        color="plant_id",
-        color_discrete_map=PLANT_COLORS,
-        title="Carbon Emissions (kg CO2)",
-        labels={"carbon_kg": "Carbon (kg)", "timestamp": "Time"}
-    )
-    
-    fig.update_layout(
-        xaxis_title="Time",
-        yaxis_title="Carbon Emissions (kg CO2)",
-        legend_title="Plant",
-        template="plotly_dark" if True else "plotly_white"
-    )
+    # A per-rerun copy, so sessions never see each other's data
+    fig = go.Figure(make_carbon_fig())
+    series = dict(tuple(df.groupby("plant_id", sort=False)))
+    known = {trace.name for trace in fig.data}
+    for plant in series.keys() - known:
+        fig.add_trace(go.Scattergl(x=[], y=[], mode="lines", name=plant))
+    
+    # Only the trace arrays change between refreshes
+    for trace in fig.data:
+        plant_df = series.get(trace.name)
+        if plant_df is None:
+            trace.x, trace.y = [], []
+            continue
+        if len(plant_df) > MAX_CHART_POINTS:
+            x = pd.to_datetime(plant_df["timestamp"]).to_numpy().astype(np.int64).astype(np.float64)
+            y = plant_df["carbon_kg"].to_numpy(dtype=np.float64)
+            plant_df = plant_df.iloc[lttb_indices(x, y, MAX_CHART_POINTS)]
+        trace.x, trace.y = plant_df["timestamp"], plant_df["carbon_kg"]
     
     st.plotly_chart(fig, use_container_width=True)
 
@@ -274,30 +405,15 @@ def efficiency_chart(df: pd.DataFrame, plants: List[str]):
         st.info("No data for selected plants")
         return
     
-    # Calculate efficiency per reading
-    df = df.copy()
-    df["efficiency"] = df["carbon_kg"] / df["production_units"]
-    
-    # Create bar chart
-    fig = px.bar(
-        df.groupby("plant_id")["efficiency"].mean().reset_index(),
-        x="plant_id",
-        y="efficiency",
-        color="plant_id",
-        color_discrete_map=PLANT_COLORS,
-        title="Average Efficiency (kg CO2 per production unit)",
-        labels={"efficiency": "Efficiency (kg/unit)", "plant_id": "Plant"}
-    )
+    # Aggregate per plant first, then divide once per plant
+    grouped = df.groupby("plant_id", sort=False)[["carbon_kg", "production_units"]].sum()
+    grouped["efficiency"] = grouped["carbon_kg"] / grouped["production_units"].clip(lower=1)
     
-    # Add threshold line
-    fig.add_hline(y=15, line_dash="dash", line_color="orange", 
-                  annotation_text="Warning Threshold")
-    fig.add_hline(y=20, line_dash="dash", line_color="red",
-                  annotation_text="Critical Threshold")
-    
-    fig.update_layout(
-        yaxis_title="Efficiency (kg CO2/unit)",
-        template="plotly_dark"
+    fig = go.Figure(make_efficiency_fig())
+    fig.update_traces(
+        x=grouped.index,
+        y=grouped["efficiency"],
+        marker_color=[PLANT_COLORS.get(plant) for plant in grouped.index],
     )
     
     st.plotly_chart(fig, use_container_width=True)
@@ -333,15 +449,23 @@ def plant_comparison(current_values: Dict):
             "Fuel (L)": "{:.1f}",
             "Production": "{:.0f}",
             "Efficiency": "{:.2f}"
-        }).background_gradient(
-            subset=["Efficiency"],
-            cmap="RdYlGn_r"  # Red for high (bad), green for low (good)
+        }).apply(
+            lambda column: efficiency_colors(column.to_numpy(dtype=float)),
+            subset=["Efficiency"]
         ),
         use_container_width=True
     )
 
 
-def alert_list(violations: List[Dict]):
+def efficiency_colors(efficiency: np.ndarray) -> List[str]:
+    """CSS backgrounds for efficiency cells from one vectorized colormap lookup"""
+    # Red for high (bad), green for low (good)
+    rgba = colormaps["RdYlGn_r"](Normalize(*EFFICIENCY_COLOR_RANGE, clip=True)(efficiency))
+    rgb = (rgba[:, :3] * 255).astype(np.uint8)
+    return [f"background-color: rgb({r}, {g}, {b})" for r, g, b in rgb]
+
+
+def alert_list(violations: Sequence[Dict]):
     """Display alert list"""
     st.subheader("🚨 Recent Alerts")
     
@@ -350,7 +474,7 @@ def alert_list(violations: List[Dict]):
         return
     
     # Show last 10 violations
-    recent = violations[-10:]
+    recent = list(violations)[-10:]
     
     for alert in reversed(recent):
         plant = alert.get("plant_id", "Unknown")
@@ -370,54 +494,32 @@ def leaderboard(current_values: Dict):
         st.info("No data available")
         return
     
-    # Create leaderboard data
-    leaderboard_data = []
-    for plant, values in current_values.items():
-        efficiency = values["efficiency"]
-        
-        # Determine rating
-        if efficiency < 10:
-            rating = "🟢 Excellent"
-        elif efficiency < 15:
-            rating = "🟡 Good"
-        elif efficiency < 20:
-            rating = "🟠 Warning"
-        else:
-            rating = "🔴 Critical"
-        
-        leaderboard_data.append({
-            "Plant": plant,
-            "Efficiency (kg/unit)": efficiency,
-            "Rating": rating,
-            "Status": "✅ Compliant" if efficiency < 15 else "⚠️ Non-compliant"
-        })
+    plants = np.array(list(current_values.keys()), dtype=object)
+    efficiency = np.fromiter((values["efficiency"] for values in current_values.values()), dtype=float)
     
     # Sort by efficiency
-    leaderboard_data.sort(key=lambda x: x["Efficiency (kg/unit)"])
+    order = np.argsort(efficiency, kind="stable")
+    plants, efficiency = plants[order], efficiency[order]
+    
+    # Rating bins are [<10, <15, <20, >=20]
+    ratings = RATING_LABELS[np.searchsorted(RATING_THRESHOLDS, efficiency, side="right")]
+    medals = np.full(len(plants), "", dtype=object)
+    medals[:len(MEDALS)] = MEDALS[:len(plants)]
     
     # Display
-    df = pd.DataFrame(leaderboard_data)
+    df = pd.DataFrame({
+        "": medals,
+        "Plant": plants,
+        "Efficiency (kg/unit)": efficiency,
+        "Rating": ratings,
+        "Status": np.where(efficiency < 15, "✅ Compliant", "⚠️ Non-compliant"),
+    })
     
-    for i, row in df.iterrows():
-        col1, col2, col3 = st.columns([1, 2, 2])
-        
-        with col1:
-            if i == 0:
-                st.markdown(f"🥇 **{row['Plant']}**")
-            elif i == 1:
-                st.markdown(f"🥈 **{row['Plant']}**")
-            elif i == 2:
-                st.markdown(f"🥉 **{row['Plant']}**")
-            else:
-                st.markdown(f"**{row['Plant']}**")
-        
-        with col2:
-            st.write(f"{row['Efficiency (kg/unit)']:.2f} kg CO2/unit")
-        
-        with col3:
-            st.write(row["Rating"])
-        
-        st.markdown("---")
+    st.dataframe(
+        df.style.format({"Efficiency (kg/unit)": "{:.2f} kg CO2/unit"}),
+        hide_index=True,
+        use_container_width=True
+    )
 
 
 def main():
@@ -439,30 +541,26 @@ def main():
         # Generate sample data
         plants = ["Plant_A", "Plant_B", "Plant_C", "Plant_D"]
         
-        # Create sample data
-        np.random.seed(42)
-        sample_data = []
+        # Create sample data, one (minute, plant) grid per column
+        rng = np.random.default_rng(42)
+        minutes = 50
+        base_carbon = np.array([100, 150, 80, 200])  # Plant_A..Plant_D
+        
+        carbon = base_carbon[None, :] * rng.uniform(0.8, 1.2, (minutes, len(plants)))
+        carbon[rng.random((minutes, len(plants))) < 0.05] *= 2.5  # 5% spike
+        carbon = carbon.ravel()
         
-        for i in range(50):
-            timestamp = datetime.now() - timedelta(minutes=50-i)
-            for plant in plants:
-                base_carbon = {"Plant_A": 100, "Plant_B": 150, "Plant_C": 80, "Plant_D": 200}[plant]
-                carbon = base_carbon * np.random.uniform(0.8, 1.2)
-                
-                if np.random.random() < 0.05:  # 5% spike
-                    carbon *= 2.5
-                
-                sample_data.append({
-                    "plant_id": plant,
-                    "timestamp": timestamp.strftime("%Y-%m-%dT%H:%M:%S.%f"),
-                    "energy_kwh": carbon * 0.82 / 2.31,
-                    "fuel_liters": carbon / 2.31,
-                    "production_units": int(carbon / 12),
-                    "carbon_kg": carbon
-                })
+        timestamps = pd.date_range(end=datetime.now() - timedelta(minutes=1), periods=minutes, freq="1min")
         
         # Convert to DataFrame
-        df = pd.DataFrame(sample_data)
+        df = pd.DataFrame({
+            "plant_id": np.tile(plants, minutes),
+            "timestamp": np.repeat(timestamps.strftime("%Y-%m-%dT%H:%M:%S.%f"), len(plants)),
+            "energy_kwh": carbon * 0.82 / 2.31,
+            "fuel_liters": carbon / 2.31,
+            "production_units": (carbon / 12).astype(int),
+            "carbon_kg": carbon,
+        })
         
         # Generate sample violations
         violations = []
@@ -470,7 +568,7 @@ def main():
             violations.append({
                 "plant_id": plant,
                 "violation_type": "THRESHOLD_EXCEEDED",
-                "message": f"Emission {np.random.uniform(500, 800):.0f}kg exceeds threshold 500kg",
+                "message": f"Emission {rng.uniform(500, 800):.0f}kg exceeds threshold 500kg",
                 "timestamp": datetime.now().isoformat()
             })
         
@@ -495,10 +593,8 @@ def main():
         }
     else:
         # Use real data from data store
-        df = data_store.get_dataframe()
-        current = data_store.get_current_values()
+        df, current, summary = store_views(data_store.version, data_store)
         violations = data_store.violations
-        summary = data_store.get_summary()
     
     # Display metrics
     metrics_row(summary)
@@ -529,10 +625,13 @@ def main():
     # Display alerts
     alert_list(violations)
     
-    # Auto-refresh
+    # Auto-refresh from a browser-side timer so the script thread is not held
     if controls["auto_refresh"]:
-        time.sleep(controls["refresh_rate"])
-        st.rerun()
+        if AUTOREFRESH_AVAILABLE:
+            st_autorefresh(interval=controls["refresh_rate"] * 1000, key="refresh")
+        else:
+            time.sleep(controls["refresh_rate"])
+            st.rerun()
 
 
 if __name__ == "__main__":
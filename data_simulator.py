@@ -1,11 +1,48 @@
 import json
-import random
 import time
-from datetime import datetime, timedelta
+from datetime import datetime
 from dataclasses import dataclass, asdict
-from typing import List, Optional
+from typing import Iterator, List, Optional
 import sys
 
+import numpy as np
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    from numba import vectorize
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+ENERGY_EMISSION_FACTOR = 0.82  # kg CO2 per kWh
+FUEL_EMISSION_FACTOR = 2.31  # kg CO2 per liter of fuel
+
+
+BATCH_CHUNK = 1024  # Readings per plant drawn at once by iter_batch
+READING_DRAWS = 5  # energy, fuel, production, temperature, spike
+
+
+def carbon_emission(energy_kwh, fuel_liters):
+    """Carbon in kg for scalars or whole arrays of readings"""
+    return energy_kwh * ENERGY_EMISSION_FACTOR + fuel_liters * FUEL_EMISSION_FACTOR
+
+
+if NUMBA_AVAILABLE:
+    # A compiled ufunc: broadcasts over arrays in one fused loop
+    carbon_emission = vectorize(["float64(float64, float64)"], nopython=True, fastmath=True)(carbon_emission)
+
+
+def dumps_line(record: dict) -> bytes:
+    """Encode one record as a newline-terminated JSON line"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(record) + "\n").encode("utf-8")
+
 
 @dataclass
 class FactoryData:
@@ -32,39 +69,74 @@ class CarbonDataSimulator:
             "Plant_C": {"energy_base": 80,  "fuel_base": 15, "production_base": 40, "temp_base": 22},
             "Plant_D": {"energy_base": 200, "fuel_base": 50, "production_base": 100, "temp_base": 30},
         }
+        self.rng = np.random.default_rng()
+        
+        # Profiles as parallel arrays (SoA) indexed by plant position; self.plants
+        # come first so batches can use the leading rows directly
+        profile_ids = list(self.plants) + [p for p in self.plant_profiles if p not in self.plants]
+        profiles = [self.plant_profiles.get(p, self.plant_profiles["Plant_A"]) for p in profile_ids]
+        self._plant_idx = {plant_id: i for i, plant_id in enumerate(profile_ids)}
+        self._energy_base = np.array([p["energy_base"] for p in profiles], dtype=np.float64)
+        self._fuel_base = np.array([p["fuel_base"] for p in profiles], dtype=np.float64)
+        self._prod_base = np.array([p["production_base"] for p in profiles], dtype=np.float64)
+        self._temp_base = np.array([p["temp_base"] for p in profiles], dtype=np.float64)
+        
+    def _draw_uniforms(self, n: int) -> np.ndarray:
+        """READING_DRAWS uniforms in [0, 1) for each of n readings, from one PCG64 call"""
+        return self.rng.random((n, READING_DRAWS))
+    
+    def generate_reading(self, plant_id: str, timestamp: datetime,
+                         uniforms: Optional[np.ndarray] = None) -> FactoryData:
+        """
+        Generate a single reading for a plant with some random variation.
         
-    def generate_reading(self, plant_id: str, timestamp: datetime) -> FactoryData:
-        """Generate a single reading for a plant with some random variation"""
-        profile = self.plant_profiles.get(plant_id, self.plant_profiles["Plant_A"]) 
+        `uniforms` is a row of `_draw_uniforms`; pass it to share one draw
+        across all plants of a tick instead of drawing per reading.
+        """
+        record = self._reading_record(plant_id, timestamp.isoformat(), uniforms)
+        del record["carbon_kg"]
+        return FactoryData(**record)
+    
+    def _reading_record(self, plant_id: str, timestamp: str,
+                        uniforms: Optional[np.ndarray] = None) -> dict:
+        """The output dict for one reading, carbon_kg included"""
+        if uniforms is None:
+            uniforms = self._draw_uniforms(1)[0]
+        energy_u, fuel_u, production_u, temp_u, spike_u = uniforms.tolist()
+        i = self._plant_idx.get(plant_id, self._plant_idx["Plant_A"])
    
-        energy_kwh = profile["energy_base"] * random.uniform(0.8, 1.2)
-        fuel_liters = profile["fuel_base"] * random.uniform(0.8, 1.2)
-        production_units = int(profile["production_base"] * random.uniform(0.8, 1.2))
-        temperature = profile["temp_base"] + random.uniform(-3, 3)
+        energy_kwh = float(self._energy_base[i]) * (0.8 + 0.4 * energy_u)
+        fuel_liters = float(self._fuel_base[i]) * (0.8 + 0.4 * fuel_u)
+        production_units = int(self._prod_base[i] * (0.8 + 0.4 * production_u))
+        temperature = float(self._temp_base[i]) + (6.0 * temp_u - 3.0)
         
-        if random.random() < 0.05:  # 5% chance of spike
+        if spike_u < 0.05:  # 5% chance of spike
             energy_kwh *= 2.5
             fuel_liters *= 2.5
-            
-        return FactoryData(
-            plant_id=plant_id,
-            timestamp=timestamp.isoformat(),
-            energy_kwh=round(energy_kwh, 2),
-            fuel_liters=round(fuel_liters, 2),
-            production_units=production_units,
-            temperature=round(temperature, 1)
-        )
+        
+        energy_kwh = round(energy_kwh, 2)
+        fuel_liters = round(fuel_liters, 2)
+        return {
+            "plant_id": plant_id,
+            "timestamp": timestamp,
+            "energy_kwh": energy_kwh,
+            "fuel_liters": fuel_liters,
+            "production_units": production_units,
+            "temperature": round(temperature, 1),
+            "carbon_kg": round(float(self.calculate_carbon(energy_kwh, fuel_liters)), 2),
+        }
     
     def calculate_carbon(self, energy_kwh: float, fuel_liters: float) -> float:
         """
         Carbon formula:
         carbon_emission = (energy_kwh × 0.82) + (fuel_liters × 2.31)
         """
-        return (energy_kwh * 0.82) + (fuel_liters * 2.31)
+        return carbon_emission(energy_kwh, fuel_liters)
     
     def stream_data(self, duration_seconds: Optional[int] = None, verbose: bool = True):
         """Stream data continuously"""
-        start_time = time.time()
+        start_time = time.monotonic()
+        next_tick = start_time
         iteration = 0
         
         print("Starting GreenLedger Data Simulator...", file=sys.stderr)
@@ -74,36 +146,40 @@ class CarbonDataSimulator:
         try:
             while True:
                 current_time = datetime.now()
+                timestamp = current_time.isoformat()
+                buf = bytearray()
+                uniforms = self._draw_uniforms(len(self.plants))
+                log_tick = verbose and iteration % 10 == 0
+                clock = current_time.strftime('%H:%M:%S')
+                log_lines = []
                 
-                # Generate data for each plant
-                for plant_id in self.plants:
-                    data = self.generate_reading(plant_id, current_time)
-                    carbon = self.calculate_carbon(data.energy_kwh, data.fuel_liters)
-                    
-                    # Output as JSON for easy parsing
-                    output = {
-                        "plant_id": data.plant_id,
-                        "timestamp": data.timestamp,
-                        "energy_kwh": data.energy_kwh,
-                        "fuel_liters": data.fuel_liters,
-                        "production_units": data.production_units,
-                        "temperature": data.temperature,
-                        "carbon_kg": round(carbon, 2)
-                    }
+                # Generate data for each plant, straight into the output dicts
+                for plant_id, plant_uniforms in zip(self.plants, uniforms):
+                    output = self._reading_record(plant_id, timestamp, plant_uniforms)
+                    buf += dumps_line(output)
                     
-                    print(json.dumps(output), flush=True)
-                    
-                    if verbose and iteration % 10 == 0:
-                        print(f"[{current_time.strftime('%H:%M:%S')}] {plant_id}: "
-                              f"Energy={data.energy_kwh:.1f}kWh, "
-                              f"Fuel={data.fuel_liters:.1f}L, "
-                              f"Carbon={carbon:.1f}kg",
-                              file=sys.stderr)
+                    if log_tick:
+                        log_lines.append(f"[{clock}] {plant_id}: "
+                                         f"Energy={output['energy_kwh']:.1f}kWh, "
+                                         f"Fuel={output['fuel_liters']:.1f}L, "
+                                         f"Carbon={output['carbon_kg']:.1f}kg")
+                
+                if log_lines:
+                    sys.stderr.write("\n".join(log_lines) + "\n")
+                
+                # One write and one flush per tick for all plants
+                sys.stdout.buffer.write(buf)
+                sys.stdout.buffer.flush()
                 
                 iteration += 1
-                time.sleep(self.base_interval)
+                
+                # Sleep to the next grid point so the body's cost does not add drift
+                next_tick += self.base_interval
+                delay = next_tick - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
 
-                if duration_seconds and (time.time() - start_time) >= duration_seconds:
+                if duration_seconds and (time.monotonic() - start_time) >= duration_seconds:
                     break
                     
         except KeyboardInterrupt:
@@ -111,25 +187,48 @@ class CarbonDataSimulator:
     
     def generate_batch(self, num_readings: int = 100) -> List[dict]:
         """Generate a batch of historical data"""
-        results = []
-        current_time = self.start_time
+        return list(self.iter_batch(num_readings))
+    
+    def iter_batch(self, num_readings: int = 100) -> Iterator[dict]:
+        """Yield a batch of historical data, drawn BATCH_CHUNK readings at a time"""
+        for first in range(0, num_readings, BATCH_CHUNK):
+            yield from self._draw_readings(first, min(BATCH_CHUNK, num_readings - first))
+    
+    def _draw_readings(self, first: int, num_readings: int) -> List[dict]:
+        """Readings `first` .. `first + num_readings` of a batch, for every plant"""
+        num_plants = len(self.plants)
         
-        for _ in range(num_readings):
-            for plant_id in self.plants:
-                data = self.generate_reading(plant_id, current_time)
-                carbon = self.calculate_carbon(data.energy_kwh, data.fuel_liters)
-                results.append({
-                    "plant_id": data.plant_id,
-                    "timestamp": data.timestamp,
-                    "energy_kwh": data.energy_kwh,
-                    "fuel_liters": data.fuel_liters,
-                    "production_units": data.production_units,
-                    "temperature": data.temperature,
-                    "carbon_kg": round(carbon, 2)
-                })
-            current_time += timedelta(seconds=self.base_interval)
+        # Draw every variation for the chunk at once, shape (readings, plants)
+        variation = self.rng.uniform(0.8, 1.2, size=(num_readings, num_plants, 3))
+        energy = self._energy_base[:num_plants] * variation[..., 0]
+        fuel = self._fuel_base[:num_plants] * variation[..., 1]
+        production = (self._prod_base[:num_plants] * variation[..., 2]).astype(np.int64)
+        temperature = self._temp_base[:num_plants] + self.rng.uniform(-3, 3, size=(num_readings, num_plants))
         
-        return results
+        spike = self.rng.random(size=(num_readings, num_plants)) < 0.05  # 5% chance of spike
+        energy[spike] *= 2.5
+        fuel[spike] *= 2.5
+        
+        energy = np.round(energy, 2)
+        fuel = np.round(fuel, 2)
+        carbon = np.round(self.calculate_carbon(energy, fuel), 2)
+        temperature = np.round(temperature, 1)
+        
+        offsets = np.round(np.arange(first, first + num_readings) * self.base_interval * 1e6).astype("timedelta64[us]")
+        timestamps = np.datetime_as_string(np.datetime64(self.start_time, "us") + offsets, unit="us")
+        
+        # Convert to Python values only at the emit step
+        columns = zip(
+            np.tile(self.plants, num_readings).tolist(),
+            np.repeat(timestamps, num_plants).tolist(),
+            energy.ravel().tolist(),
+            fuel.ravel().tolist(),
+            production.ravel().tolist(),
+            temperature.ravel().tolist(),
+            carbon.ravel().tolist(),
+        )
+        keys = ("plant_id", "timestamp", "energy_kwh", "fuel_liters", "production_units", "temperature", "carbon_kg")
+        return [dict(zip(keys, row)) for row in columns]
 
 
 def main():
@@ -154,9 +253,10 @@ def main():
     
     if args.batch > 0:
         # Batch mode - generate data and print
-        data = simulator.generate_batch(args.batch)
-        for row in data:
-            print(json.dumps(row))
+        out = sys.stdout.buffer
+        for row in simulator.iter_batch(args.batch):
+            out.write(dumps_line(row))
+        out.flush()
     else:
         # Streaming mode
         simulator.stream_data(duration_seconds=args.duration, verbose=not args.quiet)
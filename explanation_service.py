@@ -1,5 +1,6 @@
 import os
 import json
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 
@@ -65,6 +66,30 @@ For each plant, identify:
 Analysis:"""
 
 
+# Static part of the fallback violation explanation, after the per-violation header
+VIOLATION_FALLBACK_BODY = """1. Equipment malfunction or inefficiency
+2. Unexpected increase in production demand
+3. Fuel quality issues
+4. Maintenance backlog
+5. Process optimization needed
+
+**Recommended Actions:**
+1. Investigate immediate cause of exceedance
+2. Review recent operational changes
+3. Check equipment performance data
+4. Consider temporary production adjustment
+5. Schedule comprehensive efficiency audit
+
+**Timeline:**
+- Immediate: Investigation and data review
+- 24-48 hours: Preliminary findings
+- 7 days: Corrective action plan
+- 30 days: Implementation and verification
+"""
+
+MAX_LLM_WORKERS = 8  # Concurrent LLM requests; calls are network-bound
+
+
 class ExplanationService:
     """Service for generating LLM-powered explanations"""
     
@@ -72,6 +97,10 @@ class ExplanationService:
         self.model_name = model_name
         self.temperature = temperature
         self.llm = None
+        self._violation_chain = None
+        self._context_chain = None
+        self._efficiency_chain = None
+        self._executor = ThreadPoolExecutor(max_workers=MAX_LLM_WORKERS)
         self._initialize_llm()
     
     def _initialize_llm(self):
@@ -88,6 +117,20 @@ class ExplanationService:
                 api_key=api_key
             )
             print(f"Initialized LLM: {self.model_name}")
+            
+            # Prompts are parsed and chains wired once, then reused per request
+            self._violation_chain = LLMChain(llm=self.llm, prompt=PromptTemplate(
+                template=VIOLATION_EXPLANATION_TEMPLATE,
+                input_variables=["plant_id", "violation_type", "value", "threshold", "timestamp", "policy_context"]
+            ))
+            self._context_chain = LLMChain(llm=self.llm, prompt=PromptTemplate(
+                template=DEFAULT_CONTEXT_TEMPLATE,
+                input_variables=["context", "current_time", "question"]
+            ))
+            self._efficiency_chain = LLMChain(llm=self.llm, prompt=PromptTemplate(
+                template=EFFICIENCY_TEMPLATE,
+                input_variables=["plant_data"]
+            ))
         else:
             print("Warning: OPENAI_API_KEY not set. Using fallback explanations.")
     
@@ -103,13 +146,7 @@ class ExplanationService:
         """Explain why a violation occurred"""
         
         if self.llm and LANGCHAIN_AVAILABLE:
-            prompt = PromptTemplate(
-                template=VIOLATION_EXPLANATION_TEMPLATE,
-                input_variables=["plant_id", "violation_type", "value", "threshold", "timestamp", "policy_context"]
-            )
-            chain = LLMChain(llm=self.llm, prompt=prompt)
-            
-            result = chain.run({
+            result = self._violation_chain.run({
                 "plant_id": plant_id,
                 "violation_type": violation_type,
                 "value": f"{value:.1f} kg",
@@ -122,6 +159,19 @@ class ExplanationService:
             # Fallback explanation
             return self._fallback_violation_explanation(plant_id, violation_type, value, threshold, timestamp)
     
+    def explain_violations_batch(self, violations: List[Dict[str, Any]]) -> List[str]:
+        """
+        Explain several violations, with the LLM requests in flight concurrently.
+
+        Each dict holds `explain_violation` keyword arguments; results keep
+        the input order. The local fallback is cheap, so it runs inline.
+        """
+        if not (self.llm and LANGCHAIN_AVAILABLE):
+            return [self.explain_violation(**violation) for violation in violations]
+        
+        futures = [self._executor.submit(self.explain_violation, **violation) for violation in violations]
+        return [future.result() for future in futures]
+    
     def _fallback_violation_explanation(
         self,
         plant_id: str,
@@ -132,7 +182,7 @@ class ExplanationService:
     ) -> str:
         """Generate fallback explanation without LLM"""
         
-        exceedance = ((value - threshold) / threshold) * 100
+        exceedance = f"{((value - threshold) / threshold) * 100:.1f}%"
         
         explanation = f"""🚨 Violation Explanation for {plant_id}
 
@@ -140,31 +190,13 @@ class ExplanationService:
 - Violation Type: {violation_type}
 - Recorded Value: {value:.1f} kg CO2
 - Threshold: {threshold:.1f} kg CO2
-- Exceedance: {exceedance:.1f}%
+- Exceedance: {exceedance}
 - Time: {timestamp}
 
 **Analysis:**
-The facility exceeded the {violation_type} limit by {exceedance:.1f}%. This could be due to:
-1. Equipment malfunction or inefficiency
-2. Unexpected increase in production demand
-3. Fuel quality issues
-4. Maintenance backlog
-5. Process optimization needed
-
-**Recommended Actions:**
-1. Investigate immediate cause of exceedance
-2. Review recent operational changes
-3. Check equipment performance data
-4. Consider temporary production adjustment
-5. Schedule comprehensive efficiency audit
-
-**Timeline:**
-- Immediate: Investigation and data review
-- 24-48 hours: Preliminary findings
-- 7 days: Corrective action plan
-- 30 days: Implementation and verification
+The facility exceeded the {violation_type} limit by {exceedance}. This could be due to:
 """
-        return explanation
+        return explanation + VIOLATION_FALLBACK_BODY
     
     def summarize_carbon_activity(
         self,
@@ -178,13 +210,7 @@ The facility exceeded the {violation_type} limit by {exceedance:.1f}%. This coul
         
         if self.llm and LANGCHAIN_AVAILABLE:
             plant_str = json.dumps(plant_data, indent=2)
-            prompt = PromptTemplate(
-                template=DEFAULT_CONTEXT_TEMPLATE,
-                input_variables=["context", "current_time", "question"]
-            )
-            chain = LLMChain(llm=self.llm, prompt=prompt)
-            
-            result = chain.run({
+            result = self._context_chain.run({
                 "context": f"Carbon activity data: {plant_str}",
                 "current_time": datetime.now().isoformat(),
                 "question": f"Summarize carbon activity for {time_period}"
@@ -229,13 +255,7 @@ The facility exceeded the {violation_type} limit by {exceedance:.1f}%. This coul
         
         if self.llm and LANGCHAIN_AVAILABLE:
             plant_str = json.dumps(plant_data, indent=2)
-            prompt = PromptTemplate(
-                template=EFFICIENCY_TEMPLATE,
-                input_variables=["plant_data"]
-            )
-            chain = LLMChain(llm=self.llm, prompt=prompt)
-            
-            result = chain.run({
+            result = self._efficiency_chain.run({
                 "plant_data": plant_str
             })
             return result
@@ -292,17 +312,11 @@ The facility exceeded the {violation_type} limit by {exceedance:.1f}%. This coul
         """Answer a general question about carbon compliance"""
         
         if self.llm and LANGCHAIN_AVAILABLE:
-            prompt = PromptTemplate(
-                template=DEFAULT_CONTEXT_TEMPLATE,
-                input_variables=["context", "current_time", "question"]
-            )
-            chain = LLMChain(llm=self.llm, prompt=prompt)
-            
             context_str = context
             if plant_data:
                 context_str += f"\n\nData: {json.dumps(plant_data)}"
             
-            result = chain.run({
+            result = self._context_chain.run({
                 "context": context_str,
                 "current_time": datetime.now().isoformat(),
                 "question": question
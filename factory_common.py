@@ -0,0 +1,107 @@
+import datetime
+import functools
+import sys
+
+import orjson
+import pathway as pw
+
+import carbon_kernels
+import window_aggregator
+
+InputSchema = pw.schema_builder(
+    columns={
+        "plant_id": pw.column_definition(dtype=str),
+        "timestamp": pw.column_definition(dtype=str),
+        "energy_kwh": pw.column_definition(dtype=float),
+        "fuel_liters": pw.column_definition(dtype=float),
+        "production_units": pw.column_definition(dtype=int),
+        "temperature": pw.column_definition(dtype=float),
+    }
+)
+
+
+@pw.table(with_versions=True)
+class FactoryStream:
+    plant_id: str
+    timestamp: datetime.datetime
+    energy_kwh: float
+    fuel_liters: float
+    production_units: int
+    temperature: float
+
+
+class StdinReadingsSubject(pw.io.python.ConnectorSubject):
+    """Reads newline-delimited JSON readings from stdin with orjson"""
+
+    def run(self):
+        for line in sys.stdin.buffer:
+            if not line.strip():
+                continue
+            try:
+                reading = orjson.loads(line)
+                self.next(
+                    plant_id=reading["plant_id"],
+                    timestamp=reading["timestamp"],
+                    energy_kwh=float(reading["energy_kwh"]),
+                    fuel_liters=float(reading["fuel_liters"]),
+                    production_units=int(reading["production_units"]),
+                    temperature=float(reading["temperature"]),
+                )
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"Skipping malformed reading: {e}", file=sys.stderr)
+
+
+@functools.lru_cache(maxsize=None)
+def build_factory_stream() -> pw.Table:
+    """
+    Read factory readings from stdin, parse timestamps and compute carbon_kg.
+
+    The table is built once per process, so pipelines imported together
+    branch off the same source instead of each parsing the feed again.
+    """
+    factory_stream = FactoryStream(
+        pw.io.python.read(
+            StdinReadingsSubject(),
+            schema=InputSchema,
+            autocommit_duration_ms=1000,
+        )
+    )
+
+    # Readings whose timestamp does not parse come back as None and are dropped
+    parsed = factory_stream.select(
+        *pw.this.without(pw.this.timestamp),
+        timestamp_ns=carbon_kernels.parse_timestamp_ns(pw.this.timestamp),
+    ).filter(pw.this.timestamp_ns.is_not_none())
+
+    return parsed.select(
+        plant_id=pw.this.plant_id,
+        timestamp=pw.unwrap(pw.this.timestamp_ns).dt.from_timestamp(unit="ns"),
+        energy_kwh=pw.this.energy_kwh,
+        fuel_liters=pw.this.fuel_liters,
+        production_units=pw.this.production_units,
+        temperature=pw.this.temperature,
+        carbon_kg=carbon_kernels.carbon_kg(pw.this.energy_kwh, pw.this.fuel_liters),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def build_plant_windows(duration: datetime.timedelta) -> pw.Table:
+    """
+    Trailing-window statistics per plant, as a `stats` column in
+    `window_aggregator.WINDOW_COLUMNS` order.
+
+    Cached by duration, so pipelines asking for the same window share one
+    groupby and one set of accumulators.
+    """
+    rolling_window = window_aggregator.sliding_window_reducer(duration)
+    return build_factory_stream().groupby(pw.this.plant_id).reduce(
+        pw.this.plant_id,
+        stats=rolling_window(
+            pw.this.timestamp,
+            pw.this.plant_id,
+            pw.this.carbon_kg,
+            pw.this.energy_kwh,
+            pw.this.fuel_liters,
+            pw.this.production_units,
+        ),
+    )
@@ -0,0 +1,26 @@
+import argparse
+import sys
+
+import pathway as pw
+
+# Importing the pipelines builds their dataflows on the shared factory stream
+import carbon_pipeline
+import anomaly_detector
+import compliance_engine
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="GreenLedger Engine (all pipelines, one dataflow)")
+    parser.add_argument("--license-key", type=str, default=None,
+                        help="Pathway license key")
+    args = parser.parse_args()
+
+    if args.license_key:
+        pw.set_license_key(args.license_key)
+    else:
+        pw.set_license_key("demo-license-key-with-telemetry")
+
+    print("Starting GreenLedger Engine...", file=sys.stderr)
+    print("Carbon pipeline, anomaly detector and compliance engine share one input stream", file=sys.stderr)
+
+    pw.run()
@@ -1,9 +1,19 @@
 
+import bisect
+import functools
+import mmap
 import os
+import re
+import shutil
+import socketserver
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 import json
 
+import numpy as np
+import orjson
+
 
 try:
     from langchain.text_splitter import RecursiveCharacterTextSplitter
@@ -15,11 +25,96 @@ try:
 except ImportError:
     LANGCHAIN_AVAILABLE = False
 
+    class Document:
+        """Minimal stand-in for langchain's Document"""
+
+        def __init__(self, page_content: str, metadata: Optional[Dict[str, Any]] = None):
+            self.page_content = page_content
+            self.metadata = metadata or {}
+
 import pathway as pw
 
+import alert_output
+
 DOCUMENTS_DIR = Path(__file__).parent / "documents"
 CHROMA_PERSIST_DIR = "./chroma_db"
 EMBEDDING_MODEL = "text-embedding-ada-002"
+TOKEN_PATTERN = re.compile(r"\w+")
+SPLIT_PATTERN = re.compile(r"\n\n|\. |\n")  # Paragraph, sentence and line boundaries
+EMBED_BATCH_SIZE = 100  # Chunks per embedding request
+MAX_EMBED_WORKERS = 8  # Embedding requests in flight at once
+RAG_SOCKET_PATH = os.environ.get("GREENLEDGER_RAG_SOCKET", "/tmp/greenledger-rag.sock")
+
+
+def split_text(text: str, chunk_size: int, chunk_overlap: int) -> List[str]:
+    """
+    Split text into chunks of at most chunk_size characters.
+
+    Boundaries are found in one SPLIT_PATTERN scan; each chunk ends at the
+    last boundary that fits and the next one starts at the first boundary
+    inside the overlap, falling back to a hard cut when there is none.
+    """
+    boundaries = [match.end() for match in SPLIT_PATTERN.finditer(text)]
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = start + chunk_size
+        if end < len(text):
+            i = bisect.bisect_right(boundaries, end)
+            if i and boundaries[i - 1] > start:
+                end = boundaries[i - 1]
+        chunks.append(text[start:end])
+        if end >= len(text):
+            break
+        i = bisect.bisect_left(boundaries, end - chunk_overlap)
+        next_start = boundaries[i] if i < len(boundaries) and boundaries[i] < end else end - chunk_overlap
+        start = next_start if next_start > start else end
+    return chunks
+
+
+class PrecomputedEmbeddings:
+    """
+    Embeddings for a known set of texts, fetched up front in parallel batches.
+
+    Stands in for the real embeddings when building the vector store, so
+    the HTTPS round-trips overlap instead of running one batch at a time;
+    queries are still embedded by the wrapped model.
+    """
+
+    def __init__(self, embeddings, texts: List[str]):
+        self.embeddings = embeddings
+        unique = list(dict.fromkeys(texts))
+        batches = [unique[i:i + EMBED_BATCH_SIZE] for i in range(0, len(unique), EMBED_BATCH_SIZE)]
+        with ThreadPoolExecutor(max_workers=MAX_EMBED_WORKERS) as executor:
+            vectors = [v for batch in executor.map(embeddings.embed_documents, batches) for v in batch]
+        self.vectors = dict(zip(unique, vectors))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.vectors[text] if text in self.vectors else self.embeddings.embed_query(text)
+                for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+
+class MappedDocument:
+    """
+    Document whose text stays in a read-only mmap of its file.
+
+    `page_content` is decoded on each access instead of being held as a
+    str, so loaded documents only cost address space until they are read.
+    """
+
+    def __init__(self, path: Path, metadata: Dict[str, Any]):
+        self.metadata = metadata
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    @property
+    def page_content(self) -> str:
+        return self._buffer[:].decode("utf-8", errors="replace")
+
 
 class ComplianceDocumentStore:
     """Manages compliance documents for RAG"""
@@ -28,6 +123,8 @@ class ComplianceDocumentStore:
         self.documents_dir = documents_dir
         self.documents: List[Document] = []
         self.vectorstore = None
+        # Inverted index for the keyword fallback: token -> ids of documents containing it
+        self._postings: Dict[str, np.ndarray] = {}
         
     def load_documents(self) -> List[Document]:
         """Load all documents from the documents directory"""
@@ -52,6 +149,7 @@ class ComplianceDocumentStore:
                     print(f"Error loading {file_path.name}: {e}")
         
         self.documents = documents
+        self._build_index()
         return documents
     
     def _load_simple(self) -> List[Document]:
@@ -60,9 +158,8 @@ class ComplianceDocumentStore:
         for file_path in self.documents_dir.glob("*"):
             if file_path.is_file():
                 try:
-                    content = file_path.read_text(encoding='utf-8')
-                    doc = Document(
-                        page_content=content,
+                    doc = MappedDocument(
+                        file_path,
                         metadata={"source": file_path.name, "path": str(file_path)}
                     )
                     documents.append(doc)
@@ -71,25 +168,26 @@ class ComplianceDocumentStore:
                     print(f"Error loading {file_path.name}: {e}")
         
         self.documents = documents
+        self._build_index()
         return documents
     
-    def split_documents(self, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[Document]:
-        """Split documents into chunks"""
+    def split_documents(self, chunk_size: int = 1000, chunk_overlap: int = 200,
+                        fast_split: bool = True) -> List[Document]:
+        """
+        Split documents into chunks.
+
+        Plain text is cut with the compiled SPLIT_PATTERN by default; pass
+        fast_split=False to use LangChain's RecursiveCharacterTextSplitter.
+        """
         if not self.documents:
             self.load_documents()
         
-        if not LANGCHAIN_AVAILABLE:
-            # Simple chunking without LangChain
-            chunks = []
-            for doc in self.documents:
-                content = doc.page_content
-                for i in range(0, len(content), chunk_size - chunk_overlap):
-                    chunk = content[i:i + chunk_size]
-                    chunks.append(Document(
-                        page_content=chunk,
-                        metadata=doc.metadata
-                    ))
-            return chunks
+        if fast_split or not LANGCHAIN_AVAILABLE:
+            return [
+                Document(page_content=chunk, metadata=doc.metadata)
+                for doc in self.documents
+                for chunk in split_text(doc.page_content, chunk_size, chunk_overlap)
+            ]
         
         text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
@@ -97,14 +195,12 @@ class ComplianceDocumentStore:
         )
         return text_splitter.split_documents(self.documents)
     
-    def create_vectorstore(self, embeddings=None) -> Any:
-        """Create vector store from documents"""
+    def create_vectorstore(self, embeddings=None, rebuild: bool = False) -> Any:
+        """Create vector store from documents, reusing the persisted one unless `rebuild`"""
         if not LANGCHAIN_AVAILABLE:
             print("Warning: Cannot create vectorstore without LangChain")
             return None
         
-        chunks = self.split_documents()
-        
         if embeddings is None:
             # Try to get OpenAI embeddings
             api_key = os.environ.get("OPENAI_API_KEY")
@@ -114,10 +210,23 @@ class ComplianceDocumentStore:
                 print("Warning: OPENAI_API_KEY not set. Using dummy embeddings.")
                 return None
         
+        # Embeddings persisted by an earlier build are reused as is
+        if Path(CHROMA_PERSIST_DIR).exists() and not rebuild:
+            self.vectorstore = Chroma(
+                persist_directory=CHROMA_PERSIST_DIR,
+                embedding_function=embeddings
+            )
+            print(f"Loaded vectorstore from {CHROMA_PERSIST_DIR}")
+            return self.vectorstore
+        
+        # from_documents appends to an existing collection, so start clean
+        shutil.rmtree(CHROMA_PERSIST_DIR, ignore_errors=True)
+        chunks = self.split_documents()
+        
         # Create Chroma vectorstore
         self.vectorstore = Chroma.from_documents(
             documents=chunks,
-            embedding=embeddings,
+            embedding=PrecomputedEmbeddings(embeddings, [chunk.page_content for chunk in chunks]),
             persist_directory=CHROMA_PERSIST_DIR
         )
         
@@ -134,20 +243,26 @@ class ComplianceDocumentStore:
         else:
             return []
     
+    def _build_index(self):
+        """Tokenize every document once and record which documents hold each token"""
+        doc_ids: Dict[str, List[int]] = {}
+        for i, doc in enumerate(self.documents):
+            for token in set(TOKEN_PATTERN.findall(doc.page_content.lower())):
+                doc_ids.setdefault(token, []).append(i)
+        self._postings = {token: np.array(ids, dtype=np.intp) for token, ids in doc_ids.items()}
+    
     def _simple_search(self, query: str, k: int = 4) -> List[Document]:
         """Simple keyword-based search"""
-        query_lower = query.lower()
-        results = []
-        
-        for doc in self.documents:
-            # Count keyword matches
-            score = sum(1 for word in query_lower.split() if word in doc.page_content.lower())
-            if score > 0:
-                results.append((score, doc))
+        # Score = number of query words each document contains
+        scores = np.zeros(len(self.documents), dtype=np.int64)
+        for word in TOKEN_PATTERN.findall(query.lower()):
+            ids = self._postings.get(word)
+            if ids is not None:
+                scores[ids] += 1
         
         # Sort by score and return top k
-        results.sort(key=lambda x: x[0], reverse=True)
-        return [doc for _, doc in results[:k]]
+        top = np.argsort(-scores, kind="stable")[:k]
+        return [self.documents[i] for i in top if scores[i] > 0]
     
     def get_context(self, query: str, k: int = 4) -> str:
         """Get context string from search results"""
@@ -183,9 +298,15 @@ query_input = QueryTable(
 doc_store = ComplianceDocumentStore()
 doc_store.load_documents()
 
+@functools.lru_cache(maxsize=1024)
+def cached_context(query_str: str) -> str:
+    """Context for a query; the document set is fixed while the engine runs"""
+    return doc_store.get_context(query_str)
+
+
 def process_query(query_str: str) -> dict:
     """Process a query and return context"""
-    context = doc_store.get_context(query_str)
+    context = cached_context(query_str)
     
     return {
         "query": query_str,
@@ -194,18 +315,44 @@ def process_query(query_str: str) -> dict:
     }
 
 
+class QueryHandler(socketserver.StreamRequestHandler):
+    """Answers each query line with one JSON line from `process_query`"""
+
+    def handle(self):
+        for line in self.rfile:
+            query = line.decode("utf-8").strip()
+            if query:
+                self.wfile.write(orjson.dumps(process_query(query), option=orjson.OPT_APPEND_NEWLINE))
+
+
+def serve(path: str = RAG_SOCKET_PATH):
+    """
+    Serve queries on a Unix socket until interrupted.
+
+    The documents, the keyword index and any vector store opened with
+    `create_vectorstore` stay loaded in this process, so a query costs a
+    lookup instead of a fresh interpreter and store load.
+    """
+    if os.path.exists(path):
+        os.unlink(path)
+    with socketserver.ThreadingUnixStreamServer(path, QueryHandler) as server:
+        try:
+            server.serve_forever()
+        finally:
+            os.unlink(path)
+
+
 queries = query_input.select(
     query=pw.this.query,
     processed=pw.apply(process_query, pw.this.query),
 )
 
-pw.io.stdout.write(
+alert_output.write_ndjson(
     queries.select(
         pw.this.query,
         context=pw.this.processed["context"],
         num_sources=pw.this.processed["num_sources"],
     ),
-    format="json",
 )
 
 if __name__ == "__main__":
@@ -217,6 +364,8 @@ if __name__ == "__main__":
                         help="Rebuild vectorstore")
     parser.add_argument("--query", type=str, default=None,
                         help="Run a single query")
+    parser.add_argument("--serve", action="store_true",
+                        help=f"Answer queries on the Unix socket {RAG_SOCKET_PATH}")
     args = parser.parse_args()
     
   
@@ -225,13 +374,24 @@ if __name__ == "__main__":
     if args.rebuild:
         print("Rebuilding vectorstore...")
         doc_store.load_documents()
-        doc_store.create_vectorstore()
+        doc_store.create_vectorstore(rebuild=True)
+        cached_context.cache_clear()
     elif args.query:
         
         doc_store.load_documents()
         context = doc_store.get_context(args.query)
         print(f"Query: {args.query}")
         print(f"\nContext:\n{context}")
+    elif args.serve:
+        print(f"Serving RAG queries on {RAG_SOCKET_PATH}...")
+        # Load the documents and open the persisted Chroma store (or build
+        # it) once, before the first query
+        doc_store.load_documents()
+        doc_store.create_vectorstore()
+        try:
+            serve()
+        except KeyboardInterrupt:
+            print("\nStopping RAG server...")
     else:
    
         print("Starting GreenLedger RAG Engine...")
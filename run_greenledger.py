@@ -3,145 +3,283 @@ import subprocess
 import sys
 import os
 import argparse
+import json
+import runpy
+import select
+import signal
+import socket
+import time
 from pathlib import Path
 
+LOG_DIR = Path("logs")  # Per-stage output of the demo
+STOP_GRACE_SECONDS = 5  # How long demo stages get to exit after SIGTERM
+# Same default as rag_engine.RAG_SOCKET_PATH; not imported to keep the runner light
+RAG_SOCKET_PATH = os.environ.get("GREENLEDGER_RAG_SOCKET", "/tmp/greenledger-rag.sock")
+
+# Command templates; callers copy them and append per-call arguments
+ENGINE_SCRIPT_CMD = (sys.executable, "greenledger_engine.py")
+SIMULATOR_CMD = (sys.executable, "data_simulator.py")
+DASHBOARD_CMD = ("streamlit", "run", "dashboard.py")
+PIP_INSTALL_CMD = (sys.executable, "-m", "pip", "install", "--prefer-binary")
+BUILD_KERNELS_CMD = (sys.executable, "build_kernels.py")
+REQUIREMENTS_LOCK = Path("requirements.lock")  # Optional, from `pip-compile --generate-hashes requirements.txt`
+
 
 def install_dependencies():
     """Install required dependencies"""
     print("Installing dependencies...")
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", "requirements.txt"])
+    cmd = list(PIP_INSTALL_CMD)
+    if REQUIREMENTS_LOCK.exists():
+        # A fully pinned, hashed lock needs no dependency resolution
+        cmd.extend(["--require-hashes", "--no-deps", "-r", str(REQUIREMENTS_LOCK)])
+    else:
+        cmd.extend(["-r", "requirements.txt"])
+    env = dict(os.environ, PIP_DISABLE_PIP_VERSION_CHECK="1")
+    subprocess.check_call(cmd, env=env)
+    print("Compiling kernels...")
+    subprocess.check_call(list(BUILD_KERNELS_CMD))
+
+
+def run_script(script: str, *args: str):
+    """
+    Run a stage script as __main__ inside this interpreter.
+
+    Saves starting a second Python and re-importing its dependencies; the
+    stage's own argparse sees `args` as its command line.
+    """
+    sys.argv = [script, *args]
+    runpy.run_path(script, run_name="__main__")
+
+
+def exec_command(cmd: list):
+    """Replace the runner with `cmd`, which then owns the exit code and Ctrl+C"""
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.execvp(cmd[0], cmd)
 
 
 def run_simulator(duration: int = None, interval: float = 1.0):
     """Run the data simulator"""
     print("Starting data simulator...")
-    cmd = [sys.executable, "data_simulator.py"]
+    args = []
     if duration:
-        cmd.extend(["--duration", str(duration)])
+        args.extend(["--duration", str(duration)])
     if interval:
-        cmd.extend(["--interval", str(interval)])
+        args.extend(["--interval", str(interval)])
     
-    subprocess.check_call(cmd)
+    run_script("data_simulator.py", *args)
 
 
 def run_carbon_pipeline():
     """Run the carbon calculation pipeline"""
     print("Starting carbon pipeline...")
-    cmd = [sys.executable, "carbon_pipeline.py"]
-    subprocess.check_call(cmd)
+    run_script("carbon_pipeline.py")
 
 
 def run_anomaly_detector():
     """Run the anomaly detector"""
     print("Starting anomaly detector...")
-    cmd = [sys.executable, "anomaly_detector.py"]
-    subprocess.check_call(cmd)
+    run_script("anomaly_detector.py")
 
 
 def run_compliance_engine():
     """Run the compliance engine"""
     print("Starting compliance engine...")
-    cmd = [sys.executable, "compliance_engine.py"]
-    subprocess.check_call(cmd)
+    run_script("compliance_engine.py")
+
+
+def run_engine(threads: int = None):
+    """Run all streaming pipelines in a single dataflow"""
+    # Pathway shards every groupby by key hash across its worker threads,
+    # so per-plant state is spread over cores without a manual router
+    threads = threads or os.cpu_count() or 1
+    print(f"Starting GreenLedger engine on {threads} worker threads...")
+    exec_command(engine_command(threads))
+
+
+def engine_command(threads: int) -> list:
+    return ["pathway", "spawn", "--threads", str(threads), *ENGINE_SCRIPT_CMD]
+
+
+def query_rag_server(query: str):
+    """Ask a running `rag_engine.py --serve`, or return None if there is none"""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(RAG_SOCKET_PATH)
+            sock.sendall(query.replace("\n", " ").encode("utf-8") + b"\n")
+            sock.shutdown(socket.SHUT_WR)
+            reply = sock.makefile("rb").readline()
+    except (AttributeError, OSError):
+        return None
+    return json.loads(reply) if reply else None
 
 
 def run_rag_engine(query: str = None):
     """Run the RAG engine"""
     if query:
         print(f"Running RAG query: {query}")
-        cmd = [sys.executable, "rag_engine.py", "--query", query]
+        result = query_rag_server(query)
+        if result is None:
+            run_script("rag_engine.py", "--query", query)
+        else:
+            print(f"Query: {result['query']}")
+            print(f"\nContext:\n{result['context']}")
     else:
         print("Starting RAG engine...")
-        cmd = [sys.executable, "rag_engine.py"]
-    subprocess.check_call(cmd)
+        run_script("rag_engine.py")
+
+
+def run_rag_server():
+    """Keep the RAG engine loaded and answer queries over a Unix socket"""
+    print("Starting RAG server...")
+    run_script("rag_engine.py", "--serve")
 
 
 def run_explanation_service(mode: str = "test"):
     """Run the explanation service"""
     print(f"Starting explanation service in {mode} mode...")
-    cmd = [sys.executable, "explanation_service.py", "--mode", mode]
-    subprocess.check_call(cmd)
+    run_script("explanation_service.py", "--mode", mode)
 
 
 def run_dashboard():
     """Run the Streamlit dashboard"""
     print("Starting dashboard...")
-    cmd = ["streamlit", "run", "dashboard.py"]
-    subprocess.check_call(cmd)
+    exec_command(list(DASHBOARD_CMD))
 
 
-def run_demo():
+def start_stage(name: str, cmd: list, **kwargs) -> subprocess.Popen:
+    """Start a demo stage in its own process group, logging to LOG_DIR/<name>.log"""
+    log = open(LOG_DIR / f"{name}.log", "wb")
+    kwargs.setdefault("stdout", log)
+    # Python opens fds non-inheritable, so the child needs no close-all-fds pass
+    proc = subprocess.Popen(cmd, stderr=log, close_fds=False, start_new_session=True, **kwargs)
+    log.close()
+    return proc
+
+
+def wait_any(procs: list):
+    """Block until one of `procs` exits, without periodic wakeups"""
+    try:
+        pidfds = [os.pidfd_open(proc.pid) for proc in procs]
+    except (AttributeError, OSError):
+        # No pidfd support (Python < 3.9 or Linux < 5.3): block in waitid
+        # without reaping, so Popen still collects the exit status
+        if hasattr(os, "waitid"):
+            os.waitid(os.P_ALL, 0, os.WEXITED | os.WNOWAIT)
+        else:
+            procs[0].wait()
+        return
+    poller = select.poll()
+    for fd in pidfds:
+        poller.register(fd, select.POLLIN)
+    try:
+        poller.poll()
+    finally:
+        for fd in pidfds:
+            os.close(fd)
+
+
+def signal_stages(procs: list, sig: int):
+    """Send `sig` to each stage's whole process group, helpers included"""
+    for proc in procs:
+        try:
+            os.killpg(proc.pid, sig)
+        except ProcessLookupError:
+            pass
+
+
+def stop_stages(procs: list):
+    """SIGTERM every stage, then SIGKILL whatever is left after STOP_GRACE_SECONDS"""
+    # A second Ctrl+C or SIGTERM must not cut the teardown short before SIGKILL
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    signal_stages(procs, signal.SIGTERM)
+    deadline = time.monotonic() + STOP_GRACE_SECONDS
+    try:
+        for proc in procs:
+            proc.wait(timeout=max(0.0, deadline - time.monotonic()))
+    except subprocess.TimeoutExpired:
+        signal_stages(procs, signal.SIGKILL)
+        for proc in procs:
+            proc.wait()
+
+
+def interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def run_demo(threads: int = None):
     """Run a complete demo of the system"""
     print("=" * 60)
     print("GreenLedger Demo")
     print("=" * 60)
     
-    # Start dashboard in background
-    print("\nStarting dashboard...")
-    dashboard_proc = subprocess.Popen(
-        ["streamlit", "run", "dashboard.py"],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE
-    )
+    # All stages run at once: the simulator feeds the engine (carbon pipeline,
+    # anomaly detector and compliance engine in one dataflow) over a pipe
+    print("\nStarting simulator, engine and dashboard...")
+    LOG_DIR.mkdir(exist_ok=True)
+    procs = []
+    # A SIGTERM to the runner shuts the demo down like Ctrl+C
+    signal.signal(signal.SIGTERM, interrupt)
     
     try:
-        # Wait for user to stop
-        print("\nDashboard started! Press Ctrl+C to stop.")
+        # Each stage is tracked as soon as it starts, so a failed launch
+        # further down still stops the ones already running
+        simulator = start_stage("simulator", list(SIMULATOR_CMD), stdout=subprocess.PIPE)
+        procs.append(simulator)
+        procs.append(start_stage("engine", engine_command(threads or os.cpu_count() or 1),
+                                 stdin=simulator.stdout))
+        simulator.stdout.close()
+        procs.append(start_stage("dashboard", list(DASHBOARD_CMD)))
+        
+        print(f"\nDemo started! Logs are in {LOG_DIR}/. Press Ctrl+C to stop.")
         print("Open http://localhost:8501 in your browser")
         
-        # Keep running
-        while True:
-            import time
-            time.sleep(1)
+        # Keep running until a stage exits
+        wait_any(procs)
+        print("\nA stage exited, see its log. Stopping demo...")
             
     except KeyboardInterrupt:
-        print("\nStopping dashboard...")
-        dashboard_proc.terminate()
-        dashboard_proc.wait()
+        print("\nStopping demo...")
+    finally:
+        # Stages are in their own sessions, so Ctrl+C never reached them
+        stop_stages(procs)
+
+
+# Command name -> handler taking the parsed arguments
+COMMANDS = {
+    "install": lambda args: install_dependencies(),
+    "simulator": lambda args: run_simulator(args.duration, args.interval),
+    "pipeline": lambda args: run_carbon_pipeline(),
+    "anomaly": lambda args: run_anomaly_detector(),
+    "compliance": lambda args: run_compliance_engine(),
+    "engine": lambda args: run_engine(args.threads),
+    "rag": lambda args: run_rag_engine(args.query),
+    "rag-server": lambda args: run_rag_server(),
+    "explain": lambda args: run_explanation_service(args.mode),
+    "dashboard": lambda args: run_dashboard(),
+    "demo": lambda args: run_demo(args.threads),
+}
 
 
 def main():
     parser = argparse.ArgumentParser(description="GreenLedger Runner")
-    parser.add_argument("command", choices=[
-        "install",
-        "simulator",
-        "pipeline",
-        "anomaly",
-        "compliance",
-        "rag",
-        "explain",
-        "dashboard",
-        "demo"
-    ], help="Command to run")
+    parser.add_argument("command", choices=list(COMMANDS), help="Command to run")
     parser.add_argument("--duration", type=int, help="Duration for simulator (seconds)")
     parser.add_argument("--interval", type=float, default=1.0, help="Interval for simulator")
     parser.add_argument("--query", type=str, help="Query for RAG engine")
+    parser.add_argument("--threads", type=int, help="Worker threads for the engine (default: CPU count)")
     parser.add_argument("--mode", choices=["test", "interactive"], default="test", 
                        help="Mode for explanation service")
     
     args = parser.parse_args()
     
     # Change to script directory
-    os.chdir(Path(__file__).parent)
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    if os.getcwd() != script_dir:
+        os.chdir(script_dir)
     
-    if args.command == "install":
-        install_dependencies()
-    elif args.command == "simulator":
-        run_simulator(args.duration, args.interval)
-    elif args.command == "pipeline":
-        run_carbon_pipeline()
-    elif args.command == "anomaly":
-        run_anomaly_detector()
-    elif args.command == "compliance":
-        run_compliance_engine()
-    elif args.command == "rag":
-        run_rag_engine(args.query)
-    elif args.command == "explain":
-        run_explanation_service(args.mode)
-    elif args.command == "dashboard":
-        run_dashboard()
-    elif args.command == "demo":
-        run_demo()
+    COMMANDS[args.command](args)
 
 
 if __name__ == "__main__":
@@ -1,23 +1,36 @@
 import pathway as pw
 
+import carbon_kernels
+from carbon_kernels import ENERGY_EMISSION_FACTOR, FUEL_EMISSION_FACTOR
+
 @pw.table
 class Input:
     plant_id: str
     energy_kwh: float
     fuel_liters: float
 
+# Parsed once at import; the declared schema types the columns as floats up front
 data = pw.debug.table_from_markdown("""
 plant_id | energy_kwh | fuel_liters
 A        | 100        | 20
 B        | 150        | 30
-""")
-
-def carbon(e, f):
-    return e * 0.82 + f * 2.31
+""", schema=Input)
 
+# Plain column arithmetic is evaluated by the engine, no Python call per row
 result = data.select(
     plant_id=pw.this.plant_id,
-    carbon_emission=carbon(pw.this.energy_kwh, pw.this.fuel_liters)
+    carbon_emission=pw.this.energy_kwh * ENERGY_EMISSION_FACTOR + pw.this.fuel_liters * FUEL_EMISSION_FACTOR,
+    # Batched float32 kernel used by the pipelines
+    carbon_f32=carbon_kernels.carbon_kg(pw.this.energy_kwh, pw.this.fuel_liters),
+)
+
+# float32 keeps the relative error well under 1e-4 for reporting
+result = result.select(
+    *pw.this,
+    relative_error=abs(pw.this.carbon_f32 - pw.this.carbon_emission) / pw.this.carbon_emission,
 )
 
 pw.debug.compute_and_print(result)
+
+df = pw.debug.table_to_pandas(result)
+assert (df["relative_error"] < 1e-4).all(), df
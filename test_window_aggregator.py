@@ -0,0 +1,72 @@
+import pathway as pw
+
+import window_aggregator
+
+# Minutes since the epoch, turned into timestamps below
+readings = pw.debug.table_from_markdown("""
+plant_id | minute | carbon_kg | energy_kwh | fuel_liters | production_units
+A        | 1      | 10.0      | 1.0        | 2.0         | 3
+A        | 2      | 20.0      | 1.0        | 2.0         | 3
+A        | 30     | 40.0      | 1.0        | 2.0         | 3
+B        | 3      | 30.0      | 1.0        | 2.0         | 3
+""").select(
+    pw.this.plant_id,
+    pw.this.production_units,
+    # Markdown parses 10.0 as an int
+    carbon_kg=pw.cast(float, pw.this.carbon_kg),
+    energy_kwh=pw.cast(float, pw.this.energy_kwh),
+    fuel_liters=pw.cast(float, pw.this.fuel_liters),
+    timestamp=(pw.this.minute * 60_000_000_000).dt.from_timestamp(unit="ns"),
+)
+
+rolling_window = window_aggregator.sliding_window_reducer(window_aggregator.SlidingWindowAccumulator.duration)
+windows = readings.groupby(pw.this.plant_id).reduce(
+    pw.this.plant_id,
+    stats=rolling_window(
+        pw.this.timestamp,
+        pw.this.plant_id,
+        pw.this.carbon_kg,
+        pw.this.energy_kwh,
+        pw.this.fuel_liters,
+        pw.this.production_units,
+    ),
+).select(pw.this.plant_id, **window_aggregator.window_columns(pw.this.stats))
+
+pw.debug.compute_and_print(windows)
+
+# A's first two readings fell out of its 10 minute window
+df = pw.debug.table_to_pandas(windows).set_index("plant_id")
+assert df.loc["A", "reading_count"] == 1 and df.loc["A", "total_carbon_kg"] == 40.0, df
+assert df.loc["B", "reading_count"] == 1 and df.loc["B", "max_carbon_kg"] == 30.0, df
+
+# Pane totals summed over the trailing hour of 5 minute panes
+panes = pw.debug.table_from_markdown("""
+plant_id | minute | carbon | production
+A        | 0      | 1.0    | 10
+A        | 5      | 2.0    | 20
+A        | 60     | 4.0    | 40
+""").select(
+    pw.this.plant_id,
+    pw.this.production,
+    carbon=pw.cast(float, pw.this.carbon),
+    pane_start=(pw.this.minute * 60_000_000_000).dt.from_timestamp(unit="ns"),
+)
+
+trailing_hour = window_aggregator.trailing_sum_reducer(
+    window_aggregator.TrailingSumAccumulator.duration,
+    window_aggregator.TrailingSumAccumulator.pane,
+)
+hourly = panes.groupby(pw.this.plant_id).reduce(
+    pw.this.plant_id,
+    totals=trailing_hour(pw.this.pane_start, pw.this.carbon, pw.this.production),
+).select(
+    pw.this.plant_id,
+    carbon=pw.declare_type(float, pw.this.totals[2]),
+    production=pw.declare_type(int, pw.this.totals[3]),
+)
+
+pw.debug.compute_and_print(hourly)
+
+# The pane at minute 0 slid out once the one at minute 60 arrived
+df = pw.debug.table_to_pandas(hourly).set_index("plant_id")
+assert df.loc["A", "carbon"] == 6.0 and df.loc["A", "production"] == 60, df
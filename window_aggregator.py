@@ -0,0 +1,482 @@
+import hashlib
+import math
+import operator
+from collections import deque
+from datetime import timedelta
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import pathway as pw
+
+
+class TwoStacks:
+    """
+    FIFO sliding-window aggregator over a monoid (Two-Stacks, Tangwongsan et al.)
+
+    New items go on the back stack, which keeps a single running aggregate.
+    The front stack holds the oldest items together with their suffix
+    aggregates and is refilled by flipping the back stack when it runs dry,
+    so push, pop and query are all amortized O(1).
+    """
+
+    def __init__(self, combine: Callable[[Any, Any], Any], identity: Any):
+        self.combine = combine
+        self.identity = identity
+        self._front: List[Tuple[Any, Any, Any]] = []  # (key, value, suffix aggregate), oldest last
+        self._back: List[Tuple[Any, Any]] = []  # (key, value), newest last
+        self._back_agg = identity
+
+    def __len__(self) -> int:
+        return len(self._front) + len(self._back)
+
+    def push(self, key: Any, value: Any):
+        """Append an item at the newest end of the window"""
+        self._back.append((key, value))
+        self._back_agg = self.combine(self._back_agg, value)
+
+    def pop(self) -> Tuple[Any, Any]:
+        """Evict the oldest item"""
+        if not self._front:
+            self._flip()
+        key, value, _ = self._front.pop()
+        return key, value
+
+    def oldest(self) -> Tuple[Any, Any]:
+        if not self._front:
+            self._flip()
+        key, value, _ = self._front[-1]
+        return key, value
+
+    def newest(self) -> Tuple[Any, Any]:
+        if self._back:
+            return self._back[-1]
+        key, value, _ = self._front[0]
+        return key, value
+
+    def query(self) -> Any:
+        """Aggregate of every item currently in the window"""
+        if not self._front:
+            return self._back_agg
+        return self.combine(self._front[-1][2], self._back_agg)
+
+    def items(self) -> Iterator[Tuple[Any, Any]]:
+        """Iterate items from oldest to newest"""
+        for key, value, _ in reversed(self._front):
+            yield key, value
+        yield from self._back
+
+    def _flip(self):
+        agg = self.identity
+        while self._back:
+            key, value = self._back.pop()
+            agg = self.combine(value, agg)
+            self._front.append((key, value, agg))
+        self._back_agg = self.identity
+
+
+class SlickDeque:
+    """
+    Sliding-window max or min over a monotonic deque (SlickDeque, Shein et al.)
+
+    Only items that can still become the extreme are kept: a push drops
+    every newer-but-worse item from the back, so the front is always the
+    answer. Push, evict and query are amortized O(1) and no aggregate is
+    ever recombined.
+    """
+
+    def __init__(self, better: Callable[[Any, Any], bool]):
+        self.better = better
+        self._items: deque = deque()  # (key, value), values monotonic from the front
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def push(self, key: Any, value: Any):
+        while self._items and not self.better(self._items[-1][1], value):
+            self._items.pop()
+        self._items.append((key, value))
+
+    def evict(self, cutoff: Any):
+        """Drop items whose key is at or before `cutoff`"""
+        while self._items and self._items[0][0] <= cutoff:
+            self._items.popleft()
+
+    def query(self, default: Any = None) -> Any:
+        return self._items[0][1] if self._items else default
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct-count sketch with 2^12 registers (~1.6% error).
+
+    Registers stay sparse ({index: rank}) while only a few are set, which
+    is the normal case for a handful of plants, and switch to a dense
+    4 KB bytearray past SPARSE_LIMIT. Merging is a register-wise max and
+    never mutates either input, so sketches can be shared as monoid values.
+    """
+
+    __slots__ = ("registers",)
+
+    P = 12
+    M = 1 << P
+    SPARSE_LIMIT = 512
+    ALPHA = 0.7213 / (1 + 1.079 / M)
+
+    def __init__(self, registers=None):
+        self.registers = registers if registers is not None else {}
+
+    @classmethod
+    def of(cls, value: str) -> "HyperLogLog":
+        digest = hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest()
+        h = int.from_bytes(digest, "big")
+        rest_bits = 64 - cls.P
+        rest = h & ((1 << rest_bits) - 1)
+        return cls({h >> rest_bits: rest_bits - rest.bit_length() + 1})
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, HyperLogLog) and self._dense() == other._dense()
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        if not other.registers:
+            return self
+        if not self.registers:
+            return other
+        if isinstance(self.registers, bytearray) and isinstance(other.registers, bytearray):
+            return HyperLogLog(bytearray(map(max, self.registers, other.registers)))
+        if isinstance(other.registers, bytearray):
+            return other.merge(self)
+        # other is sparse here; fold its few registers into a copy of self
+        dense = isinstance(self.registers, bytearray)
+        merged = bytearray(self.registers) if dense else dict(self.registers)
+        for index, rank in other.registers.items():
+            current = merged[index] if dense else merged.get(index, 0)
+            if rank > current:
+                merged[index] = rank
+        if not dense and len(merged) > self.SPARSE_LIMIT:
+            merged = HyperLogLog(merged)._dense()
+        return HyperLogLog(merged)
+
+    def count(self) -> int:
+        registers = self.registers.values() if isinstance(self.registers, dict) else self.registers
+        ranks = [rank for rank in registers if rank]
+        zeros = self.M - len(ranks)
+        estimate = self.ALPHA * self.M * self.M / (zeros + sum(2.0 ** -rank for rank in ranks))
+        if estimate <= 2.5 * self.M and zeros:
+            # Linear counting is exact-ish for small cardinalities
+            estimate = self.M * math.log(self.M / zeros)
+        return round(estimate)
+
+    def _dense(self) -> bytearray:
+        if isinstance(self.registers, bytearray):
+            return self.registers
+        dense = bytearray(self.M)
+        for index, rank in self.registers.items():
+            dense[index] = rank
+        return dense
+
+
+class WindowStats(NamedTuple):
+    """
+    Monoid of the per-window statistics used by the pipelines.
+
+    Carbon variance is kept as Welford moments (mean, M2) and merged with
+    Chan's parallel formula, which stays numerically stable where a
+    sum-of-squares would cancel. Max and min are not part of the monoid;
+    SlidingWindowAccumulator tracks them with SlickDeques.
+    """
+    count: int
+    carbon_sum: float
+    carbon_mean: float
+    carbon_m2: float
+    energy_sum: float
+    fuel_sum: float
+    production_sum: int
+    plants: HyperLogLog
+
+    @classmethod
+    def of(cls, plant_id: str, carbon_kg: float, energy_kwh: float,
+           fuel_liters: float, production_units: int) -> "WindowStats":
+        return cls(1, carbon_kg, carbon_kg, 0.0, energy_kwh, fuel_liters, production_units, HyperLogLog.of(plant_id))
+
+    @staticmethod
+    def combine(a: "WindowStats", b: "WindowStats") -> "WindowStats":
+        if not a.count:
+            return b
+        if not b.count:
+            return a
+        count = a.count + b.count
+        delta = b.carbon_mean - a.carbon_mean
+        return WindowStats(
+            count,
+            a.carbon_sum + b.carbon_sum,
+            a.carbon_mean + delta * b.count / count,
+            a.carbon_m2 + b.carbon_m2 + delta * delta * a.count * b.count / count,
+            a.energy_sum + b.energy_sum,
+            a.fuel_sum + b.fuel_sum,
+            a.production_sum + b.production_sum,
+            a.plants.merge(b.plants),
+        )
+
+
+EMPTY_STATS = WindowStats(0, 0.0, 0.0, 0.0, 0.0, 0.0, 0, HyperLogLog())
+
+# Pathway types the reducer column from compute_result's annotation, so
+# this has to list each entry's type for the unpacked columns to be usable
+WindowResult = Tuple[
+    Optional[pw.DateTimeNaive],  # window_start
+    Optional[pw.DateTimeNaive],  # window_end
+    int,  # reading_count
+    float,  # total_carbon_kg
+    float,  # mean_carbon_kg
+    float,  # std_carbon_kg
+    float,  # max_carbon_kg
+    float,  # min_carbon_kg
+    float,  # total_energy_kwh
+    float,  # total_fuel_liters
+    int,  # total_production
+    int,  # unique_plants
+    float,  # current_carbon
+    float,  # current_energy
+    float,  # current_fuel
+]
+
+# Order of the values returned by the sliding window reducer
+WINDOW_COLUMNS = (
+    "window_start",
+    "window_end",
+    "reading_count",
+    "total_carbon_kg",
+    "mean_carbon_kg",
+    "std_carbon_kg",
+    "max_carbon_kg",
+    "min_carbon_kg",
+    "total_energy_kwh",
+    "total_fuel_liters",
+    "total_production",
+    "unique_plants",
+    "current_carbon",
+    "current_energy",
+    "current_fuel",
+)
+
+
+class SlidingWindowAccumulator(pw.BaseCustomAccumulator):
+    """
+    Trailing-window statistics for one group, updated incrementally.
+
+    Holds the readings of the last `duration` in a Two-Stacks aggregator,
+    with carbon max/min in a pair of SlickDeques, and evicts expired ones
+    on every update, so state stays bounded by the window size instead of
+    growing with the stream. That bound is also why input is assumed to
+    be append-only, see `retract`.
+    """
+
+    duration = timedelta(minutes=10)
+
+    def __init__(self):
+        self.window = TwoStacks(WindowStats.combine, EMPTY_STATS)
+        self.carbon_max = SlickDeque(operator.gt)
+        self.carbon_min = SlickDeque(operator.lt)
+        self.latest = None  # (timestamp, carbon_kg, energy_kwh, fuel_liters)
+
+    @classmethod
+    def sort_by(cls, row):
+        # Rows of a batch arrive in timestamp order, so they take the O(1)
+        # push path instead of each late one rebuilding the window
+        return row[0]
+
+    @classmethod
+    def from_row(cls, row):
+        timestamp, plant_id, carbon_kg, energy_kwh, fuel_liters, production_units = row
+        acc = cls()
+        acc._push(timestamp, WindowStats.of(
+            plant_id, carbon_kg, energy_kwh, fuel_liters, production_units
+        ))
+        acc.latest = (timestamp, carbon_kg, energy_kwh, fuel_liters)
+        return acc
+
+    def update(self, other):
+        for timestamp, stats in other.window.items():
+            if not self.window or timestamp >= self.window.newest()[0]:
+                self._push(timestamp, stats)
+            else:
+                # Late reading: rebuild in timestamp order, rare on a live feed
+                self._rebuild([*self.window.items(), (timestamp, stats)])
+        if other.latest is not None and (self.latest is None or other.latest[0] >= self.latest[0]):
+            self.latest = other.latest
+        self._evict()
+
+    def retract(self, other):
+        """
+        Best effort only: the reducer assumes append-only input, which the
+        stdin feed is. Readings still in the window are removed exactly,
+        but retracting the newest one moves the cutoff back, and readings
+        already evicted under the old cutoff are not restored.
+        """
+        removed = list(other.window.items())
+        remaining = []
+        for item in self.window.items():
+            if item in removed:
+                removed.remove(item)
+            else:
+                remaining.append(item)
+        self._rebuild(remaining)
+        # Items hold one reading each, so the newest left is the current one
+        if self.window:
+            timestamp, stats = self.window.newest()
+            self.latest = (timestamp, stats.carbon_sum, stats.energy_sum, stats.fuel_sum)
+        else:
+            self.latest = None
+
+    def compute_result(self) -> WindowResult:
+        stats = self.window.query()
+        window_end = self.window.newest()[0] if self.window else None
+        variance = stats.carbon_m2 / (stats.count - 1) if stats.count > 1 else 0.0
+        current_carbon, current_energy, current_fuel = (
+            self.latest[1:] if self.latest is not None else (0.0, 0.0, 0.0)
+        )
+        return (
+            window_end - self.duration if window_end is not None else None,
+            window_end,
+            stats.count,
+            stats.carbon_sum,
+            stats.carbon_mean,
+            math.sqrt(variance),
+            self.carbon_max.query(0.0),
+            self.carbon_min.query(0.0),
+            stats.energy_sum,
+            stats.fuel_sum,
+            stats.production_sum,
+            stats.plants.count(),
+            current_carbon,
+            current_energy,
+            current_fuel,
+        )
+
+    def _push(self, timestamp, stats: WindowStats):
+        self.window.push(timestamp, stats)
+        self.carbon_max.push(timestamp, stats.carbon_sum)
+        self.carbon_min.push(timestamp, stats.carbon_sum)
+
+    def _rebuild(self, items):
+        self.window = TwoStacks(WindowStats.combine, EMPTY_STATS)
+        self.carbon_max = SlickDeque(operator.gt)
+        self.carbon_min = SlickDeque(operator.lt)
+        for timestamp, stats in sorted(items, key=lambda item: item[0]):
+            self._push(timestamp, stats)
+
+    def _evict(self):
+        cutoff = self.window.newest()[0] - self.duration
+        while self.window and self.window.oldest()[0] <= cutoff:
+            self.window.pop()
+        self.carbon_max.evict(cutoff)
+        self.carbon_min.evict(cutoff)
+
+
+# Pathway pickles accumulators between batches, so every window length
+# needs its own module-level class; add a subclass here for a new one
+SLIDING_WINDOW_ACCUMULATORS = {
+    SlidingWindowAccumulator.duration: SlidingWindowAccumulator,
+}
+
+
+def sliding_window_reducer(duration: timedelta):
+    """
+    Reducer over a trailing window of the given duration.
+
+    Call it as `reducer(timestamp, plant_id, carbon_kg, energy_kwh,
+    fuel_liters, production_units)`; the result is a tuple ordered as
+    `WINDOW_COLUMNS`, see `window_columns`.
+    """
+    if duration not in SLIDING_WINDOW_ACCUMULATORS:
+        raise ValueError(f"No sliding window accumulator for {duration}, "
+                         f"register one in SLIDING_WINDOW_ACCUMULATORS")
+    return pw.reducers.udf_reducer(SLIDING_WINDOW_ACCUMULATORS[duration])
+
+
+def window_columns(stats: pw.ColumnExpression) -> Dict[str, pw.ColumnExpression]:
+    """Map WINDOW_COLUMNS names to expressions unpacking a reducer result"""
+    return {name: stats[i] for i, name in enumerate(WINDOW_COLUMNS)}
+
+
+class TrailingSumAccumulator(pw.BaseCustomAccumulator):
+    """
+    Running sums over the panes of the last `duration`, for one group.
+
+    Sums are invertible, so each pane is added once on arrival and
+    subtracted once when it leaves the window (or is retracted because
+    its totals changed), instead of re-adding every pane per hop.
+    """
+
+    duration = timedelta(hours=1)
+    pane = timedelta(minutes=5)
+
+    def __init__(self):
+        self.panes: deque = deque()  # (pane_start, values), oldest first
+        self.totals: Tuple = ()
+
+    @classmethod
+    def from_row(cls, row):
+        pane_start, *values = row
+        acc = cls()
+        acc.panes.append((pane_start, tuple(values)))
+        acc.totals = tuple(values)
+        return acc
+
+    def update(self, other):
+        for pane_start, values in other.panes:
+            if self.panes and pane_start < self._window_start():
+                continue  # Already slid out of the window
+            if self.panes and pane_start < self.panes[-1][0]:
+                self.panes = deque(sorted([*self.panes, (pane_start, values)], key=lambda item: item[0]))
+            else:
+                self.panes.append((pane_start, values))
+            self._add(values, 1)
+        self._evict()
+
+    def retract(self, other):
+        for item in other.panes:
+            if item in self.panes:
+                self.panes.remove(item)
+                self._add(item[1], -1)
+
+    def compute_result(self) -> tuple:
+        # Untyped because the number of values varies; callers declare the
+        # entry types with pw.declare_type when unpacking
+        if not self.panes:
+            return (None, None, *self.totals)
+        window_start = self._window_start()
+        return (window_start, window_start + self.duration, *self.totals)
+
+    def _add(self, values, sign: int):
+        if not self.totals:
+            self.totals = tuple(0 for _ in values)
+        self.totals = tuple(total + sign * value for total, value in zip(self.totals, values))
+
+    def _window_start(self):
+        return self.panes[-1][0] + self.pane - self.duration
+
+    def _evict(self):
+        window_start = self._window_start()
+        while self.panes and self.panes[0][0] < window_start:
+            _, values = self.panes.popleft()
+            self._add(values, -1)
+
+
+# Module-level classes for the same pickling reason as the sliding windows
+TRAILING_SUM_ACCUMULATORS = {
+    (TrailingSumAccumulator.duration, TrailingSumAccumulator.pane): TrailingSumAccumulator,
+}
+
+
+def trailing_sum_reducer(duration: timedelta, pane: timedelta):
+    """
+    Reducer summing pane totals over a trailing window.
+
+    Call it as `reducer(pane_start, value, ...)`; the result is
+    `(window_start, window_end, sum_of_value, ...)` for the window ending
+    with the newest pane.
+    """
+    if (duration, pane) not in TRAILING_SUM_ACCUMULATORS:
+        raise ValueError(f"No trailing sum accumulator for {duration} over {pane} panes, "
+                         f"register one in TRAILING_SUM_ACCUMULATORS")
+    return pw.reducers.udf_reducer(TRAILING_SUM_ACCUMULATORS[duration, pane])